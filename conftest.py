@@ -0,0 +1,4 @@
+"""
+pytest根目录配置
+本文件所在目录即项目根目录，pytest收集测试时会将其加入sys.path，测试用例直接以power_market_simulator包名导入
+"""
@@ -1,11 +1,6 @@
 """
 现货出清系统演示程序
 """
-import sys
-import os
-
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
 
 from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
 from power_market_simulator.models.time_series import create_sample_day_ahead_data
@@ -36,14 +36,16 @@ class SpotMarketClearing:
         if not self.network.generators:
             raise ValueError("网络中没有定义发电机")
         
+        valid_node_ids = frozenset(self.network.nodes)
+        
         # 检查发电机是否都连接到有效节点
         for gen in self.network.generators.values():
-            if gen.node_id not in self.network.nodes:
+            if gen.node_id not in valid_node_ids:
                 raise ValueError(f"发电机 {gen.id} 连接到不存在的节点 {gen.node_id}")
         
         # 检查负荷是否都连接到有效节点
         for load in self.network.loads.values():
-            if load.node_id not in self.network.nodes:
+            if load.node_id not in valid_node_ids:
                 raise ValueError(f"负荷 {load.id} 连接到不存在的节点 {load.node_id}")
 
 
@@ -0,0 +1,55 @@
+"""
+24小时优先顺序出清内核
+以分段报价张量为输入，各小时相互独立，安装numba时JIT编译
+仅24个小时、每小时数十个报价段，串行循环即可，不启用numba并行（避免主进程启动线程池）
+"""
+import numpy as np
+from power_market_simulator.algorithms._numba import njit
+
+
+@njit(cache=True)
+def merit_order_clear(bid_tensor: np.ndarray, bid_counts: np.ndarray, demand_per_hour: np.ndarray):
+    """
+    不考虑网络约束，按报价从低到高逐段满足各小时的全网需求
+    bid_tensor: [小时×机组×段×(起始出力, 结束出力, 报价)]，第g台机组只使用前bid_counts[g]段
+    返回: (各小时出清价格, 各报价段出力[小时×机组×段])
+    供应不足、需求非正或需求恰好落在段边界（边际价格不唯一）的小时出清价格为NaN
+    """
+    n_hours, n_gens, n_seg, _ = bid_tensor.shape
+    n_offers = bid_counts.sum()
+    clearing_price = np.full(n_hours, np.nan)
+    dispatch = np.zeros((n_hours, n_gens, n_seg))
+
+    for h in range(n_hours):
+        # 按机组、段的顺序展开该小时的报价
+        prices = np.empty(n_offers)
+        capacities = np.empty(n_offers)
+        offer_gen = np.empty(n_offers, dtype=np.int64)
+        offer_seg = np.empty(n_offers, dtype=np.int64)
+        k = 0
+        for g in range(n_gens):
+            for s in range(bid_counts[g]):
+                prices[k] = bid_tensor[h, g, s, 2]
+                capacities[k] = bid_tensor[h, g, s, 1] - bid_tensor[h, g, s, 0]
+                offer_gen[k] = g
+                offer_seg[k] = s
+                k += 1
+
+        demand = demand_per_hour[h]
+        if demand <= 0.0:
+            continue
+
+        order = np.argsort(prices, kind='mergesort')
+        cumulative = 0.0
+        for k in range(n_offers):
+            j = order[k]
+            previous = cumulative
+            cumulative += capacities[j]
+            if cumulative >= demand:
+                if cumulative > demand:
+                    dispatch[h, offer_gen[j], offer_seg[j]] = demand - previous
+                    clearing_price[h] = prices[j]
+                break
+            dispatch[h, offer_gen[j], offer_seg[j]] = capacities[j]
+
+    return clearing_price, dispatch
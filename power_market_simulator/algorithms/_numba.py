@@ -0,0 +1,16 @@
+"""
+Numba可选依赖
+安装numba时对数值内核进行JIT编译，未安装时退化为普通Python函数
+"""
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """未安装numba时的空装饰器"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
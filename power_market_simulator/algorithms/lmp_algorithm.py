@@ -2,46 +2,377 @@
 节点边际出清算法实现
 基于直流潮流的节点边际电价计算
 """
+from dataclasses import dataclass
 import numpy as np
+import scipy.sparse as sp
 from typing import Dict, List, Tuple
-from scipy.optimize import linprog
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
 from power_market_simulator.models.network import Network, Generator, Load
 from power_market_simulator.models.time_series import BidSegment
+from power_market_simulator.algorithms._numba import njit
+from power_market_simulator.algorithms.network_kernels import solve_dc_lmp
+
+try:
+    import highspy
+except ImportError:  # highspy为可选依赖，未安装时使用scipy的linprog
+    highspy = None
+
+
+@dataclass
+class PTDFMatrix:
+    """功率传输分布因子(PTDF)矩阵"""
+    matrix: np.ndarray  # 线路潮流对节点注入功率的灵敏度 [线路×节点]
+    line_limits: np.ndarray  # 各有效线路的热稳定极限(MW)
+    island_labels: np.ndarray  # 各节点所属电气岛编号
+    n_islands: int  # 电气岛数量
+    flow_block: sp.csr_matrix = None  # 线路潮流约束系数 [PTDF; -PTDF]
+    from_idx: np.ndarray = None  # 各有效线路起始节点下标
+    to_idx: np.ndarray = None  # 各有效线路终止节点下标
+
+
+def build_ptdf(network: Network, node_to_idx: Dict[str, int]) -> PTDFMatrix:
+    """
+    基于直流潮流模型构建PTDF矩阵
+    每个电气岛取首个节点为平衡节点，对去除平衡节点后的节点导纳矩阵做一次LU分解
+    """
+    n_nodes = len(node_to_idx)
+    
+    # 只翻译一次有效线路的端点下标和参数，之后全部为数组运算
+    active_lines = [line for line in network.lines.values() if line.is_active]
+    n_lines = len(active_lines)
+    from_idx = np.fromiter((node_to_idx[line.from_node] for line in active_lines), dtype=np.int32, count=n_lines)
+    to_idx = np.fromiter((node_to_idx[line.to_node] for line in active_lines), dtype=np.int32, count=n_lines)
+    reactance = np.fromiter((line.reactance for line in active_lines), dtype=np.float64, count=n_lines)
+    line_limits = np.fromiter((line.thermal_limit for line in active_lines), dtype=np.float64, count=n_lines)
+    
+    # 支路-节点关联矩阵和支路电纳
+    line_range = np.arange(n_lines)
+    incidence = sp.csr_matrix(
+        (np.concatenate([np.ones(n_lines), -np.ones(n_lines)]),
+         (np.concatenate([line_range, line_range]), np.concatenate([from_idx, to_idx]))),
+        shape=(n_lines, n_nodes)
+    )
+    susceptance = 1.0 / reactance
+    
+    # 支路导纳矩阵 Bf = diag(b)·A
+    branch_b = sp.diags(susceptance) @ incidence
+    
+    # 网络已冻结且线路未变化时直接复用其B矩阵的电气岛划分和LU分解
+    factor = network.dc_factor(list(node_to_idx), from_idx, to_idx, susceptance)
+    if factor is not None:
+        _, n_islands, island_labels, non_slack, lu = factor
+    else:
+        # 节点导纳矩阵 B = Aᵀ·diag(b)·A，识别电气岛，每个岛的首个节点作为平衡节点
+        bus_b = (incidence.T @ branch_b).tocsc()
+        n_islands, island_labels = connected_components(abs(bus_b), directed=False)
+        _, slack_idx = np.unique(island_labels, return_index=True)
+        non_slack = np.setdiff1d(np.arange(n_nodes), slack_idx)
+        lu = splu(bus_b[non_slack][:, non_slack].tocsc()) if n_lines > 0 and len(non_slack) > 0 else None
+    
+    ptdf = np.zeros((n_lines, n_nodes))
+    if lu is not None:
+        # B_red对称，PTDF_red = Bf_red·B_red⁻¹ = (B_red⁻¹·Bf_redᵀ)ᵀ
+        ptdf[:, non_slack] = lu.solve(branch_b[:, non_slack].T.toarray()).T
+    
+    # 线路潮流约束系数块以CSR格式存放，舍去LU回代产生的数值噪声以保持稀疏
+    ptdf_sparse = sp.csr_matrix(np.where(np.abs(ptdf) < 1e-12, 0.0, ptdf))
+    
+    return PTDFMatrix(
+        matrix=ptdf,
+        line_limits=line_limits,
+        island_labels=island_labels,
+        n_islands=n_islands,
+        flow_block=sp.vstack([ptdf_sparse, -ptdf_sparse], format='csr'),
+        from_idx=from_idx,
+        to_idx=to_idx
+    )
+
+
+@dataclass
+class _ElementArrays:
+    """
+    出清所需的发电机和负荷属性（SoA），按网络中generators和loads的顺序排列
+    只取决于网络元件，同一网络的多次出清（如24小时各时段）可共享，不必每次遍历元件对象
+    """
+    gen_id: np.ndarray  # 发电机ID（object数组）
+    gen_node_idx: np.ndarray  # 发电机所在节点下标
+    gen_min: np.ndarray  # 最小出力(MW)
+    gen_max: np.ndarray  # 最大出力(MW)
+    gen_cost: np.ndarray  # 边际成本(元/MWh)
+    load_node_idx: np.ndarray  # 负荷所在节点下标
+    load_demand: np.ndarray  # 负荷需求(MW)
+
+
+def build_element_arrays(network: Network, node_to_idx: Dict[str, int]) -> _ElementArrays:
+    """遍历一次网络元件，将出清用到的属性整理为数组"""
+    gens = list(network.generators.values())
+    n_gens = len(gens)
+    loads = list(network.loads.values())
+    n_loads = len(loads)
+    return _ElementArrays(
+        gen_id=np.array([gen.id for gen in gens], dtype=object),
+        gen_node_idx=np.fromiter((node_to_idx[gen.node_id] for gen in gens), dtype=np.int32, count=n_gens),
+        gen_min=np.fromiter((gen.min_power for gen in gens), dtype=np.float64, count=n_gens),
+        gen_max=np.fromiter((gen.max_power for gen in gens), dtype=np.float64, count=n_gens),
+        gen_cost=np.fromiter((gen.marginal_cost for gen in gens), dtype=np.float64, count=n_gens),
+        load_node_idx=np.fromiter((node_to_idx[load.node_id] for load in loads), dtype=np.int32, count=n_loads),
+        load_demand=np.fromiter((load.demand for load in loads), dtype=np.float64, count=n_loads)
+    )
+
+
+@dataclass
+class _StructureCache:
+    """
+    线性规划中与报价、容量和负荷无关的部分
+    只取决于各发电变量所在节点和网络拓扑，结构相同的多次出清（如24小时各时段）可共享
+    """
+    var_node_idx: np.ndarray  # 各发电变量所在节点下标
+    A_eq: sp.csr_matrix  # 节点及电气岛功率平衡约束系数
+    A_ub: sp.csr_matrix  # 线路潮流约束系数
+    b_ub: np.ndarray  # 线路潮流约束右端项
+    
+    def matches(self, var_node_idx: np.ndarray, n_eq_rows: int) -> bool:
+        """判断给定的变量布局能否复用该结构"""
+        return self.A_eq.shape[0] == n_eq_rows and np.array_equal(self.var_node_idx, var_node_idx)
+
+
+@njit(cache=True)
+def _marginal_price(prices: np.ndarray, capacities: np.ndarray, demand: float) -> float:
+    """
+    单个节点的优先顺序边际价格，prices已按升序排列
+    在累计供应曲线上查找首个满足需求的段；供应不足时取最高报价加500
+    """
+    cumulative_supply = np.cumsum(capacities)
+    k = np.searchsorted(cumulative_supply, demand)
+    if k < len(prices):
+        return prices[k]
+    return prices[len(prices) - 1] + 500.0
+
+
+@njit(cache=True)
+def _simple_lmp_kernel(node_ptr: np.ndarray, prices: np.ndarray, capacities: np.ndarray,
+                       demands: np.ndarray) -> np.ndarray:
+    """
+    按节点计算优先顺序（merit order）边际价格
+    prices/capacities按节点连续存放且节点内已按价格升序排列，
+    第i个节点的供应段为[node_ptr[i], node_ptr[i+1])
+    """
+    n_nodes = len(demands)
+    lmp_out = np.empty(n_nodes)
+    
+    for i in range(n_nodes):
+        start = node_ptr[i]
+        end = node_ptr[i + 1]
+        if start == end:
+            lmp_out[i] = 1000.0  # 没有发电机
+        else:
+            lmp_out[i] = _marginal_price(prices[start:end], capacities[start:end], demands[i])
+    
+    return lmp_out
+
+
+@njit(cache=True)
+def _congestion_adjust_kernel(lmp_values: np.ndarray, from_idx: np.ndarray, to_idx: np.ndarray):
+    """
+    按有效线路顺序检查两端价差，价差超过阈值时按拥堵成本抬高起始节点电价
+    后面的线路使用已调整的价格，因此按线路顺序逐条处理
+    """
+    for k in range(len(from_idx)):
+        from_lmp = lmp_values[from_idx[k]]
+        to_lmp = lmp_values[to_idx[k]]
+        
+        # 如果两端价格差异大，可能存在传输约束
+        price_diff = abs(from_lmp - to_lmp)
+        if price_diff > 10:  # 价格差异阈值
+            congestion_cost = price_diff * 0.1  # 拥堵成本系数
+            lmp_values[from_idx[k]] = max(from_lmp, from_lmp + congestion_cost / 2)
+            lmp_values[to_idx[k]] = max(lmp_values[to_idx[k]], to_lmp - congestion_cost / 2)
+
+
+class HighsWarmStartSolver:
+    """
+    基于highspy的线性规划求解器
+    连续求解结构相同的问题（如逐小时出清）时，以上一次的最优基作为初始基；
+    约束矩阵与上一次为同一对象（共享的线性规划结构）时只更新成本、变量上下限和右端项
+    """
+    
+    def __init__(self):
+        self._highs = highspy.Highs()
+        self._highs.setOptionValue("output_flag", False)
+        self._basis = None
+        self._shape = None
+        self._matrices = None  # 当前已载入模型的(A_eq, A_ub)
+    
+    def solve(self, c, A_eq, b_eq, A_ub, b_ub, bounds):
+        """求解线性规划，返回与linprog结果相同字段的OptimizeResult对象"""
+        from scipy.optimize import OptimizeResult
+        
+        inf = highspy.kHighsInf
+        n_eq = A_eq.shape[0]
+        cost = np.asarray(c, dtype=np.float64)
+        bounds = np.asarray(bounds, dtype=np.float64)  # [变量×2]，无界为±inf
+        col_lower = np.ascontiguousarray(bounds[:, 0])
+        col_upper = np.ascontiguousarray(bounds[:, 1])
+        row_lower = np.concatenate([b_eq, np.full(len(b_ub), -inf)])
+        row_upper = np.concatenate([b_eq, b_ub])
+        
+        if self._matrices is not None and self._matrices[0] is A_eq and self._matrices[1] is A_ub:
+            # 约束矩阵不变，原地修改模型，HiGHS保留上一次的最优基
+            cols = np.arange(len(cost), dtype=np.int32)
+            rows = np.arange(len(row_lower), dtype=np.int32)
+            self._highs.changeColsCost(len(cols), cols, cost)
+            self._highs.changeColsBounds(len(cols), cols, col_lower, col_upper)
+            self._highs.changeRowsBounds(len(rows), rows, row_lower, row_upper)
+        else:
+            A = sp.vstack([A_eq, A_ub], format='csr')
+            
+            lp = highspy.HighsLp()
+            lp.num_col_ = A.shape[1]
+            lp.num_row_ = A.shape[0]
+            lp.col_cost_ = cost
+            lp.col_lower_ = col_lower
+            lp.col_upper_ = col_upper
+            lp.row_lower_ = row_lower
+            lp.row_upper_ = row_upper
+            lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+            lp.a_matrix_.num_row_ = A.shape[0]
+            lp.a_matrix_.num_col_ = A.shape[1]
+            lp.a_matrix_.start_ = A.indptr
+            lp.a_matrix_.index_ = A.indices
+            lp.a_matrix_.value_ = A.data
+            
+            self._highs.passModel(lp)
+            self._matrices = (A_eq, A_ub)
+            # 问题规模不变时复用上一次的最优基
+            if self._basis is not None and self._shape == A.shape:
+                self._highs.setBasis(self._basis)
+            self._shape = A.shape
+        self._highs.run()
+        
+        status = self._highs.getModelStatus()
+        success = status == highspy.HighsModelStatus.kOptimal
+        if not success:
+            self._basis = None
+            self._matrices = None
+            return OptimizeResult(success=False, message=self._highs.modelStatusToString(status))
+        
+        self._basis = self._highs.getBasis()
+        solution = self._highs.getSolution()
+        row_dual = np.array(solution.row_dual)
+        return OptimizeResult(
+            success=True,
+            message=self._highs.modelStatusToString(status),
+            x=np.array(solution.col_value),
+            eqlin=OptimizeResult(marginals=row_dual[:n_eq]),
+            ineqlin=OptimizeResult(marginals=row_dual[n_eq:])
+        )
 
 
 class LMPAlgorithm:
     """节点边际电价算法类"""
     
-    def __init__(self, network: Network, bid_segments: Dict[str, List[BidSegment]] = None):
+    # 变量数（报价段数+节点数）不超过该值的单岛网络先尝试直接按优先顺序出清
+    _TINY_MAX_VARS = 16
+    # 总发电容量低于总需求的该比例时给出警告（允许少量短缺），警告中按该比例描述短缺程度
+    _deficit_ratio = 0.9
+    _deficit_wording = "远小于"
+    
+    def __init__(self, network: Network, bid_segments: Dict[str, List[BidSegment]] = None,
+                 ptdf: PTDFMatrix = None, solver: HighsWarmStartSolver = None,
+                 structure: _StructureCache = None, gen_max: np.ndarray = None,
+                 bid_arrays: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = None,
+                 elements: _ElementArrays = None):
         self.network = network
         self.bid_segments = bid_segments or {}
+        # 可选的已整理分段报价数组，格式同Network.compile_bids的返回值，提供时不再读取bid_segments
+        self._bid_arrays = bid_arrays
+        # 可选的热启动求解器，为None时使用linprog
+        self.solver = solver
         self.node_to_idx = {node_id: idx for idx, node_id in enumerate(network.nodes.keys())}
         self.idx_to_node = {idx: node_id for node_id, idx in self.node_to_idx.items()}
+        # 按节点下标排列的节点ID，节点ID只在__init__中翻译为整数下标，计算过程全部按下标索引
+        self._node_id_arr = np.array(list(network.nodes), dtype=object)
+        # 拓扑不变时可复用已有的PTDF矩阵（如24小时时序仿真）
+        self.ptdf = ptdf if ptdf is not None else build_ptdf(network, self.node_to_idx)
+        
+        # 以数组（SoA）形式缓存发电机和负荷属性，后续计算只做数组运算，避免重复访问对象属性
+        # 元件不变时可复用已有的数组（如24小时时序仿真中各时段共用基础网络）
+        self._elements = elements if elements is not None else build_element_arrays(network, self.node_to_idx)
+        self._gen_id = self._elements.gen_id
+        self._gen_node_idx = self._elements.gen_node_idx
+        self._gen_min = self._elements.gen_min
+        # 可按generators顺序传入各机组最大出力（如时序仿真中按小时折算的容量），不必为每小时重建网络
+        self._gen_max = self._elements.gen_max if gen_max is None else np.asarray(gen_max, dtype=np.float64)
+        self._gen_cost = self._elements.gen_cost
+        
+        # 负荷所在节点下标和需求，按节点汇总一次
+        self._load_node_idx = self._elements.load_node_idx
+        self._load_demand = self._elements.load_demand
+        self._load_per_node = np.bincount(self._load_node_idx, weights=self._load_demand,
+                                          minlength=len(self._node_id_arr))
+        
+        # 与负荷无关的优化问题系数在首次构建时缓存，负荷右端项使用预分配的缓冲区
+        self._static_problem = None
+        self._supply = None  # 按变量展开的供应段数组，首次使用时构建
+        # 可选的共享线性规划结构，变量布局不一致时重新构建
+        self._structure = structure
+        self._b_eq_buf = np.zeros(len(self._node_id_arr) + self.ptdf.n_islands)
     
-    def calculate_lmp(self) -> Dict[str, float]:
+    def set_supply(self, gen_max: np.ndarray = None,
+                   bid_arrays: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = None):
+        """
+        替换各机组最大出力和分段报价数组，网络、PTDF和元件属性数组沿用当前实例
+        用于逐小时出清时复用同一实例；与负荷无关的问题系数在下次求解时按新数据重建
+        """
+        if gen_max is not None:
+            self._gen_max = np.asarray(gen_max, dtype=np.float64)
+        if bid_arrays is not None:
+            self._bid_arrays = bid_arrays
+        self._supply = None
+        self._static_problem = None
+    
+    def calculate_lmp(self, demand_override: np.ndarray = None) -> Dict[str, float]:
         """
         计算节点边际电价
+        :param demand_override: 按节点顺序给出的负荷需求，为None时使用网络中的负荷
         返回: {节点ID: LMP价格}
         """
+        node_demand = self._load_per_node if demand_override is None else np.asarray(demand_override, dtype=np.float64)
+        
+        # 小规模网络在线路不阻塞时无需调用求解器
+        lmp = self._tiny_lmp(node_demand)
+        if lmp is not None:
+            return lmp
+        
         try:
             # 获取优化问题的参数
-            c, A_eq, b_eq, A_ub, b_ub, bounds = self._build_optimization_problem()
+            c, A_eq, b_eq, A_ub, b_ub, bounds = self._build_optimization_problem(node_demand)
             
             # 求解线性规划问题
-            result = linprog(
-                c=c,
-                A_eq=A_eq,
-                b_eq=b_eq,
-                A_ub=A_ub,
-                b_ub=b_ub,
-                bounds=bounds,
-                method='highs'
-            )
+            if self.solver is not None:
+                result = self.solver.solve(c, A_eq, b_eq, A_ub, b_ub, bounds)
+            else:
+                # 延迟导入：快速路径和简化方法不需要加载scipy.optimize
+                from scipy.optimize import linprog
+                result = linprog(
+                    c=c,
+                    A_eq=A_eq,
+                    b_eq=b_eq,
+                    A_ub=A_ub,
+                    b_ub=b_ub,
+                    bounds=bounds,
+                    method='highs-ds'  # 对偶单纯形，直接给出约束的对偶变量
+                )
             
             if not result.success:
                 print(f"优化求解失败: {result.message}")
                 # 使用简化方法计算LMP
-                return self._calculate_simple_lmp()
+                return self._calculate_simple_lmp(node_demand)
+            
+            if getattr(result, 'eqlin', None) is None:
+                # 旧版本scipy不返回对偶变量
+                return self._calculate_simple_lmp(node_demand)
             
             # 获取对偶变量（节点边际电价）
             lmp = self._extract_lmp(result)
@@ -49,229 +380,237 @@ class LMPAlgorithm:
         except Exception as e:
             print(f"计算LMP时出现异常: {e}")
             # 出现异常时返回简化方法计算的LMP
-            return self._calculate_simple_lmp()
+            return self._calculate_simple_lmp(node_demand)
     
-    def _build_optimization_problem(self) -> Tuple:
-        """构建优化问题的系数矩阵，支持分段报价"""
-        n_nodes = len(self.network.nodes)
-        gen_list = list(self.network.generators.values())
-        
-        # 为每台机组的每个报价段创建变量
-        segments_info = []  # 存储分段信息
-        
-        # 计算总的优化变量数量
-        total_vars = 0
-        for gen in gen_list:
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 该发电机有分段报价
-                segments = self.bid_segments[gen.id]
-                segments_info.extend([(gen.id, i, seg) for i, seg in enumerate(segments)])
-                total_vars += len(segments)
-            else:
-                # 该发电机无分段报价（如新能源），使用单一变量
-                segments_info.append((gen.id, 0, None))  # None表示无分段
-                total_vars += 1
+    def _tiny_lmp(self, node_demand: np.ndarray):
+        """
+        小规模单岛网络的快速出清：按全网优先顺序安排出力，若所有线路潮流均未达到极限，
+        则全网电价等于边际段的报价，与线性规划的对偶解相同
+        出现线路阻塞、供应不足或需求恰好落在段边界（对偶解不唯一）时返回None，交由线性规划求解
+        """
+        n_nodes = len(self._node_id_arr)
+        if self.ptdf.n_islands != 1 or not len(self._gen_id):
+            return None
         
-        if total_vars == 0:
-            # 如果没有发电机，创建一个虚拟变量
-            total_vars = 1
-            segments_info = [("virtual", 0, None)]
+        var_gen, prices, lower, upper, _ = self._collect_supply()
+        if len(var_gen) + n_nodes > self._TINY_MAX_VARS or not np.isfinite(upper).all():
+            return None
         
-        # 目标函数系数（各段的报价或边际成本）
-        c = np.zeros(total_vars)
+        lmp_values, _ = solve_dc_lmp(prices, lower, upper, self._gen_node_idx[var_gen],
+                                     np.asarray(node_demand, dtype=np.float64),
+                                     np.ascontiguousarray(self.ptdf.matrix), self.ptdf.line_limits)
+        if not len(lmp_values):
+            return None
+        return dict(zip(self._node_id_arr.tolist(), lmp_values.tolist()))
+    
+    def _build_optimization_problem(self, node_demand: np.ndarray = None) -> Tuple:
+        """
+        构建优化问题的系数矩阵，支持分段报价
+        变量为各报价段出力和各节点净注入功率，约束包括节点功率平衡、
+        电气岛功率平衡以及基于PTDF的线路潮流约束
+        除负荷右端项外的系数与负荷无关，首次构建后缓存；右端项写入预分配的缓冲区，
+        再次调用时会被覆盖
+        """
+        n_nodes = len(self._node_id_arr)
+        if node_demand is None:
+            node_demand = self._load_per_node
         
-        var_idx = 0
-        for gen_id, seg_idx, segment in segments_info:
-            if segment is not None:
-                # 有分段报价的机组
-                c[var_idx] = segment.price
-                var_idx += 1
-            else:
-                # 无分段报价的机组（新能源等）
-                gen = self.network.generators[gen_id]
-                c[var_idx] = gen.marginal_cost
-                var_idx += 1
-        
-        # 节点功率平衡约束
-        A_eq = np.zeros((n_nodes, total_vars))
-        b_eq = np.zeros(n_nodes)
-        
-        # 对每个节点建立功率平衡方程
-        var_idx = 0
-        for i, gen in enumerate(gen_list):
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 该发电机有分段报价
-                segments = self.bid_segments[gen.id]
-                node_idx = self.node_to_idx[gen.node_id]
-                
-                for j in range(len(segments)):
-                    A_eq[node_idx, var_idx + j] = 1.0
-                var_idx += len(segments)
-            else:
-                # 该发电机无分段报价
-                node_idx = self.node_to_idx[gen.node_id]
-                A_eq[node_idx, var_idx] = 1.0
-                var_idx += 1
+        if self._static_problem is None:
+            self._static_problem = self._build_static_problem()
+        c, A_eq, A_ub, b_ub, bounds, total_gen_capacity = self._static_problem
+        
+        # 节点负荷作为右端项，电气岛平衡行的右端项恒为0
+        b_eq = self._b_eq_buf
+        b_eq[:n_nodes] = node_demand
+        
+        # 检查供需平衡
+        total_demand = b_eq.sum()
+        
+        if total_gen_capacity < total_demand * self._deficit_ratio:
+            print(f"警告: 总发电容量({total_gen_capacity:.2f}MW){self._deficit_wording}总需求({total_demand:.2f}MW)")
+        
+        return c, A_eq, b_eq, A_ub, b_ub, bounds
+    
+    def _build_static_problem(self) -> Tuple:
+        """构建与负荷无关的目标函数、约束矩阵和变量上下限"""
+        n_nodes = len(self._node_id_arr)
         
-        # 获取负荷数据
-        for node_idx, node_id in self.idx_to_node.items():
-            node_loads = self.network.get_loads_at_node(node_id)
-            total_load = sum(load.demand for load in node_loads)
-            b_eq[node_idx] = total_load  # 负荷作为右端项
+        if not len(self._gen_id):
+            raise ValueError("网络中没有定义发电机")
+        
+        var_gen, prices, lower, upper, _ = self._collect_supply()
+        var_node_idx = self._gen_node_idx[var_gen]
+        
+        # 节点净注入功率变量位于发电变量之后
+        n_gen_vars = len(prices)
+        total_vars = n_gen_vars + n_nodes
+        
+        # 目标函数系数（各段的报价或边际成本），净注入变量成本为0
+        c = np.zeros(total_vars)
+        c[:n_gen_vars] = prices
+        
+        # 约束矩阵只与变量布局有关，布局不变时直接复用
+        if self._structure is None or not self._structure.matches(var_node_idx, n_nodes + self.ptdf.n_islands):
+            self._structure = self._build_structure(var_node_idx)
+        A_eq, A_ub, b_ub = self._structure.A_eq, self._structure.A_ub, self._structure.b_ub
         
         # 变量约束（各段容量限制）
-        bounds = []
-        var_idx = 0
-        for gen in gen_list:
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 有分段报价的机组
-                segments = self.bid_segments[gen.id]
-                for seg in segments:
-                    bounds.append((0, seg.capacity()))
-                var_idx += len(segments)
-            else:
-                # 无分段报价的机组（新能源等）
-                bounds.append((gen.min_power, gen.max_power))
-                var_idx += 1
+        # 以[变量×2]数组传给求解器，避免构建元组列表
+        bounds = np.empty((total_vars, 2))
+        bounds[:n_gen_vars, 0] = lower
+        bounds[:n_gen_vars, 1] = upper
+        total_gen_capacity = upper[np.isfinite(upper)].sum()  # 有限上限之和
         
-        # 检查供需平衡
-        total_gen_capacity = sum(b[1] for b in bounds if b[1] is not None and b[1] != np.inf)  # 上限总和
-        total_demand = sum(b_eq)
+        # 节点净注入功率不设上下限
+        bounds[n_gen_vars:] = (-np.inf, np.inf)
+        
+        return c, A_eq, A_ub, b_ub, bounds, total_gen_capacity
+    
+    def _collect_supply(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        汇总各发电机的供应段：有分段报价的机组每段一个变量，其余机组（如新能源）一个变量
+        返回: (所属发电机下标, 价格, 出力下限, 出力上限, 是否来自分段报价)，按发电机顺序排列
+        结果在首次调用时缓存，调用方不应原地修改返回的数组
+        """
+        if self._supply is not None:
+            return self._supply
         
-        if total_gen_capacity < total_demand * 0.9:  # 允许少量短缺
-            print(f"警告: 总发电容量({total_gen_capacity:.2f}MW)远小于总需求({total_demand:.2f}MW)")
+        # 分段报价按机组整理为补齐的二维数组，按行展开即为各段变量
+        if self._bid_arrays is not None:
+            seg_starts, seg_ends, seg_price_table, n_seg = self._bid_arrays
+        else:
+            seg_starts, seg_ends, seg_price_table, n_seg = self.network.compile_bids(self.bid_segments)
+        seg_mask = np.arange(seg_starts.shape[1]) < n_seg[:, None]
+        segmented = n_seg > 0
+        seg_counts = np.maximum(n_seg, 1)
         
-        return c, A_eq, b_eq, None, None, bounds
+        # 先按机组参数填充，再用分段报价覆盖对应的变量
+        var_gen = np.repeat(np.arange(len(self._gen_id), dtype=np.int32), seg_counts)
+        prices = self._gen_cost[var_gen]
+        lower = self._gen_min[var_gen]
+        upper = self._gen_max[var_gen]
+        is_segment = segmented[var_gen]
+        if segmented.any():
+            prices[is_segment] = seg_price_table[seg_mask]
+            lower[is_segment] = 0.0
+            upper[is_segment] = (seg_ends - seg_starts)[seg_mask]
+        
+        self._supply = (var_gen, prices, lower, upper, is_segment)
+        return self._supply
     
-    def _build_transmission_constraints(self, n_gens: int, n_nodes: int, n_lines: int) -> Tuple:
-        """构建输电线路容量约束"""
-        if n_lines == 0:
-            return np.zeros((0, n_gens)), np.zeros(0)
-        
-        # 获取发电机列表
-        gen_list = list(self.network.generators.values())
-        
-        # 确定线路数量
-        active_lines = [line for line in self.network.lines.values() if line.is_active]
-        n_active_lines = len(active_lines)
-        if n_active_lines == 0:
-            return np.zeros((0, n_gens)), np.zeros(0)
-        
-        # 使用直流潮流模型构建线路约束
-        A_ub = np.zeros((2 * n_active_lines, n_gens))
-        b_ub = np.zeros(2 * n_active_lines)
-        
-        for idx, line in enumerate(active_lines):
-            from_node_idx = self.node_to_idx[line.from_node]
-            to_node_idx = self.node_to_idx[line.to_node]
-            
-            # 对于每条线路，建立功率传输约束
-            # 线路潮流 = sum(B * theta)，但在LMP计算中直接用节点注入功率对线路的影响
-            # 在直流潮流中，线路潮流主要受节点注入功率影响
-            for gen_idx, gen in enumerate(gen_list):
-                gen_node_idx = self.node_to_idx[gen.node_id]
-                
-                # 计算发电机对线路潮流的影响因子（简化处理）
-                # 这里使用节点-线路关联矩阵的简化版本
-                if gen_node_idx == from_node_idx:
-                    # 发电机在from节点，对线路有正向影响
-                    A_ub[2 * idx, gen_idx] = 1.0  # 简化处理
-                    A_ub[2 * idx + 1, gen_idx] = -1.0  # 对应下限约束
-                elif gen_node_idx == to_node_idx:
-                    # 发电机在to节点，对线路有负向影响
-                    A_ub[2 * idx, gen_idx] = -1.0
-                    A_ub[2 * idx + 1, gen_idx] = 1.0
-            
-            # 线路容量限制
-            b_ub[2 * idx] = line.thermal_limit       # 上限
-            b_ub[2 * idx + 1] = line.thermal_limit  # 下限（负方向）
+    def _build_structure(self, var_node_idx: np.ndarray) -> _StructureCache:
+        """构建功率平衡约束和线路潮流约束的系数矩阵"""
+        n_nodes = len(self._node_id_arr)
+        n_gen_vars = len(var_node_idx)
+        total_vars = n_gen_vars + n_nodes
+        node_range = np.arange(n_nodes, dtype=np.int32)
+        
+        # 节点功率平衡约束: 节点发电 - 节点净注入 = 节点负荷
+        # 电气岛功率平衡约束: 岛内节点净注入之和 = 0
+        # 每个变量只出现在一个节点平衡行中，以稀疏矩阵形式构建
+        # 关联矩阵系数只有±1，先以int8存放，交给求解器前再转换为float64
+        rows = np.concatenate([var_node_idx, node_range, n_nodes + self.ptdf.island_labels.astype(np.int32)])
+        cols = np.concatenate([np.arange(n_gen_vars, dtype=np.int32), n_gen_vars + node_range, n_gen_vars + node_range])
+        data = np.concatenate([
+            np.ones(n_gen_vars, dtype=np.int8),
+            np.full(n_nodes, -1, dtype=np.int8),
+            np.ones(n_nodes, dtype=np.int8)
+        ])
+        A_eq = sp.coo_matrix(
+            (data, (rows, cols)),
+            shape=(n_nodes + self.ptdf.n_islands, total_vars)
+        ).tocsr().astype(np.float64)
+        
+        # 线路潮流约束
+        A_ub, b_ub = self._build_transmission_constraints(n_gen_vars)
+        
+        return _StructureCache(var_node_idx=var_node_idx, A_eq=A_eq, A_ub=A_ub, b_ub=b_ub)
+    
+    def get_elements(self) -> _ElementArrays:
+        """返回当前使用的元件属性数组，供同一网络的其他出清实例复用"""
+        return self._elements
+    
+    def get_structure(self) -> _StructureCache:
+        """返回当前使用的线性规划结构，供结构相同的其他出清实例复用"""
+        if self._static_problem is None:
+            self._static_problem = self._build_static_problem()
+        return self._structure
+    
+    def _lmp_from_duals(self, eq_marginals: np.ndarray) -> Dict[str, float]:
+        """由节点功率平衡约束的对偶变量得到节点边际电价"""
+        return dict(zip(self._node_id_arr.tolist(), eq_marginals[:len(self._node_id_arr)].tolist()))
+    
+    def _build_transmission_constraints(self, n_gen_vars: int) -> Tuple:
+        """
+        构建输电线路容量约束: -极限 <= PTDF·节点净注入 <= 极限
+        系数块[PTDF; -PTDF]随PTDF矩阵只构建一次，发电变量对应的列全为零
+        """
+        n_lines = len(self.ptdf.line_limits)
+        A_ub = sp.hstack([
+            sp.csr_matrix((2 * n_lines, n_gen_vars)),
+            self.ptdf.flow_block
+        ], format='csr')
+        b_ub = np.concatenate([self.ptdf.line_limits, self.ptdf.line_limits])
         
         return A_ub, b_ub
     
     def _extract_lmp(self, result) -> Dict[str, float]:
-        """从优化结果中提取节点边际电价"""
-        # 获取功率平衡约束的对偶变量（即节点边际电价）
-        # 由于scipy的linprog不直接返回对偶变量，我们使用简化方法
-        
-        # 这里我们使用一种近似方法来计算LMP
-        # 实际的LMP是功率平衡约束的拉格朗日乘子
-        lmp_values = self._calculate_simple_lmp()
+        """
+        从优化结果中提取节点边际电价
+        节点功率平衡约束的对偶变量即为电能分量与阻塞分量之和，直接读取，不再计算PTDFᵀ与线路对偶变量的乘积
+        需要分解时使用_lmp_components
+        """
+        return self._lmp_from_duals(result.eqlin.marginals)
+    
+    def _lmp_components(self, result) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        将节点边际电价分解为电能分量和阻塞分量
+        电能分量为所在电气岛功率平衡约束的对偶变量（即平衡节点电价），
+        阻塞分量为 PTDFᵀ·(ν⁺ - ν⁻)，ν⁺/ν⁻为线路正反向潮流约束的对偶变量
+        两者之和与节点功率平衡约束的对偶变量相等
+        """
+        n_nodes = len(self._node_id_arr)
+        n_lines = len(self.ptdf.line_limits)
+        island_duals = result.eqlin.marginals[n_nodes:]
+        line_duals = result.ineqlin.marginals
         
-        return lmp_values
+        energy = island_duals[self.ptdf.island_labels]
+        congestion = self.ptdf.matrix.T @ (line_duals[:n_lines] - line_duals[n_lines:])
+        return energy, congestion
     
-    def _calculate_simple_lmp(self) -> Dict[str, float]:
+    def _calculate_simple_lmp(self, node_demand: np.ndarray = None) -> Dict[str, float]:
         """计算简化的LMP（考虑分段报价）"""
-        lmp = {}
+        if node_demand is None:
+            node_demand = self._load_per_node
         
-        for node_id in self.network.nodes.keys():
-            # 获取该节点的发电机
-            node_gens = [gen for gen in self.network.generators.values() if gen.node_id == node_id]
-            
-            # 获取该节点的负荷
-            node_loads = self.network.get_loads_at_node(node_id)
-            total_demand = sum(load.demand for load in node_loads)
-            
-            if not node_gens:
-                lmp[node_id] = 1000.0  # 没有发电机
-                continue
-            
-            # 构建供应曲线
-            supply_curve = []
-            
-            for gen in node_gens:
-                if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                    # 该发电机有分段报价
-                    segments = self.bid_segments[gen.id]
-                    for seg in segments:
-                        supply_curve.append((seg.price, seg.capacity()))
-                else:
-                    # 该发电机无分段报价，使用边际成本
-                    capacity = min(gen.max_power, total_demand)  # 简化的容量限制
-                    supply_curve.append((gen.marginal_cost, capacity))
-            
-            # 按价格排序供应曲线
-            supply_curve.sort(key=lambda x: x[0])
-            
-            # 计算满足需求的边际成本
-            cumulative_supply = 0.0
-            marginal_price = 0.0
-            
-            for price, capacity in supply_curve:
-                cumulative_supply += capacity
-                if cumulative_supply >= total_demand:
-                    marginal_price = price
-                    break
-            
-            if cumulative_supply < total_demand:
-                # 如果供应不足，设定高价格
-                marginal_price = max([x[0] for x in supply_curve]) + 500.0 if supply_curve else 800.0
-            elif not supply_curve:
-                marginal_price = 500.0  # 如果没有供应，设定基础价格
-            
-            lmp[node_id] = marginal_price
+        var_gen, prices, _, upper, is_segment = self._collect_supply()
+        var_node_idx = self._gen_node_idx[var_gen]
+        
+        # 无分段报价的机组容量不超过所在节点负荷（简化的容量限制）
+        capacities = np.where(is_segment, upper, np.minimum(upper, node_demand[var_node_idx]))
+        
+        # 一次全局排序：先按节点、再按价格，得到各节点连续存放的供应曲线
+        # lexsort为稳定排序，同价供应段保持原有的机组顺序
+        order = np.lexsort((prices, var_node_idx))
+        n_nodes = len(self._node_id_arr)
+        node_ptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        node_ptr[1:] = np.cumsum(np.bincount(var_node_idx, minlength=n_nodes))
+        
+        lmp_values = _simple_lmp_kernel(
+            node_ptr,
+            prices[order],
+            capacities[order],
+            np.ascontiguousarray(node_demand, dtype=np.float64)
+        )
         
-        # 考虑网络约束的影响
-        self._adjust_lmp_for_network_constraints(lmp)
+        # 简化方法没有线路约束的对偶信息，按相邻节点价差估计阻塞影响
+        self._adjust_lmp_for_network_constraints(lmp_values)
         
-        return lmp
+        return dict(zip(self._node_id_arr.tolist(), lmp_values.tolist()))
     
-    def _adjust_lmp_for_network_constraints(self, lmp: Dict[str, float]):
-        """根据网络约束调整LMP"""
-        # 遍历所有线路，检查是否存在传输约束
-        for line in self.network.lines.values():
-            if line.is_active:
-                from_lmp = lmp[line.from_node]
-                to_lmp = lmp[line.to_node]
-                
-                # 如果两端价格差异大，可能存在传输约束
-                price_diff = abs(from_lmp - to_lmp)
-                if price_diff > 10:  # 价格差异阈值
-                    # 检查是否有大量电力从低价节点流向高价节点
-                    # 但受到线路容量限制
-                    # 这时需要调整价格以反映拥堵成本
-                    congestion_cost = price_diff * 0.1  # 拥堵成本系数
-                    lmp[line.from_node] = max(lmp[line.from_node], from_lmp + congestion_cost/2)
-                    lmp[line.to_node] = max(lmp[line.to_node], to_lmp - congestion_cost/2)
+    def _adjust_lmp_for_network_constraints(self, lmp_values: np.ndarray):
+        """根据网络约束调整LMP（按节点下标排列的价格数组，原地修改）"""
+        _congestion_adjust_kernel(lmp_values, self.ptdf.from_idx, self.ptdf.to_idx)
 
 
 def run_clearing(network: Network, bid_segments: Dict[str, List[BidSegment]] = None) -> Dict[str, float]:
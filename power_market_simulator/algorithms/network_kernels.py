@@ -0,0 +1,91 @@
+"""
+直流潮流出清数值内核
+输入为按整数下标排列的NumPy数组（与Network.freeze()的SoA布局一致），安装numba时JIT编译
+"""
+import numpy as np
+from power_market_simulator.algorithms._numba import njit
+
+
+@njit(cache=True)
+def solve_dc_lmp(offer_price: np.ndarray, offer_min: np.ndarray, offer_max: np.ndarray,
+                 offer_node_idx: np.ndarray, node_demand: np.ndarray, ptdf: np.ndarray,
+                 line_limits: np.ndarray):
+    """
+    单岛无阻塞情形下的直流出清：出力先取下限，剩余需求按报价从低到高分配，
+    再以PTDF计算线路潮流；所有线路均未达到极限时全网电价等于边际报价
+    返回: (节点电价, 各报价出力)；出现供应不足、需求恰好落在段边界（对偶解不唯一）
+    或线路阻塞时节点电价为空数组，需要交由线性规划求解
+    """
+    n_nodes = len(node_demand)
+    dispatch = offer_min.copy()
+    no_price = np.empty(0)
+
+    residual = node_demand.sum() - offer_min.sum()
+    if residual <= 0.0:
+        return no_price, dispatch
+
+    # 按报价升序累加可调容量，首个累计容量不小于剩余需求的报价为边际报价
+    order = np.argsort(offer_price, kind='mergesort')
+    cumulative = 0.0
+    marginal = -1
+    for k in range(len(order)):
+        j = order[k]
+        previous = cumulative
+        cumulative += offer_max[j] - offer_min[j]
+        if cumulative >= residual:
+            if cumulative == residual:
+                return no_price, dispatch
+            dispatch[j] += residual - previous
+            marginal = j
+            break
+        dispatch[j] = offer_max[j]
+    if marginal < 0:
+        return no_price, dispatch
+
+    # 节点净注入与线路潮流校验
+    injection = -node_demand.copy()
+    for j in range(len(dispatch)):
+        injection[offer_node_idx[j]] += dispatch[j]
+    for line in range(ptdf.shape[0]):
+        flow = 0.0
+        for i in range(n_nodes):
+            flow += ptdf[line, i] * injection[i]
+        if abs(flow) >= line_limits[line]:
+            return no_price, dispatch
+
+    return np.full(n_nodes, offer_price[marginal]), dispatch
+
+
+@njit(cache=True)
+def assemble_hourly_supply(bid_tensor: np.ndarray, bid_counts: np.ndarray, gen_cost: np.ndarray,
+                           gen_min: np.ndarray, gen_max: np.ndarray):
+    """
+    按LMPAlgorithm._collect_supply的变量布局一次生成各小时的供应段系数：
+    有分段报价的机组每段一个变量（下限0、上限为段容量、价格为段报价），其余机组一个变量
+    bid_tensor: [小时×机组×段×(起始出力, 结束出力, 报价)]；gen_max: [小时×机组]
+    返回: (价格, 出力下限, 出力上限)，均为[小时×变量]
+    """
+    n_hours, n_gens = gen_max.shape
+    n_vars = 0
+    for g in range(n_gens):
+        n_vars += max(bid_counts[g], 1)
+
+    prices = np.empty((n_hours, n_vars))
+    lower = np.empty((n_hours, n_vars))
+    upper = np.empty((n_hours, n_vars))
+    for h in range(n_hours):
+        k = 0
+        for g in range(n_gens):
+            if bid_counts[g] > 0:
+                for s in range(bid_counts[g]):
+                    prices[h, k] = bid_tensor[h, g, s, 2]
+                    lower[h, k] = 0.0
+                    upper[h, k] = bid_tensor[h, g, s, 1] - bid_tensor[h, g, s, 0]
+                    k += 1
+            else:
+                prices[h, k] = gen_cost[g]
+                lower[h, k] = gen_min[g]
+                upper[h, k] = gen_max[h, g]
+                k += 1
+
+    return prices, lower, upper
@@ -2,202 +2,288 @@
 24小时时序仿真算法
 扩展节点边际出清算法以支持时序仿真和分段报价
 """
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from typing import Dict, List, Tuple
-from scipy.optimize import linprog
-from power_market_simulator.models.network import Network, Generator, Load
-from power_market_simulator.models.time_series import DayAheadMarketData, BidSegment
-from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm
+import scipy.sparse as sp
+from typing import Dict, List, Optional, Tuple
+from power_market_simulator.models.network import Generator, Load
+from power_market_simulator.models.time_series import DayAheadMarketData
+from power_market_simulator.algorithms.lmp_algorithm import (
+    LMPAlgorithm, HighsWarmStartSolver, PTDFMatrix, _ElementArrays, _StructureCache, build_ptdf, highspy
+)
+from power_market_simulator.algorithms._merit_order import merit_order_clear
+from power_market_simulator.algorithms.network_kernels import assemble_hourly_supply
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # threadpoolctl为可选依赖，未安装时工作进程沿用默认的BLAS线程数
+    threadpool_limits = None
 
 
 class TimeSeriesLMPAlgorithm:
     """时序节点边际电价算法类"""
     
-    def __init__(self, day_ahead_data: DayAheadMarketData):
+    def __init__(self, day_ahead_data: DayAheadMarketData, max_workers: int = 1, ptdf: PTDFMatrix = None):
         self.day_ahead_data = day_ahead_data
         self.hourly_results = {}  # 存储每小时的计算结果
+        # 并行进程数：为1时依次尝试优先顺序出清、合并求解和逐小时串行求解；
+        # 不为1时直接按小时分发到进程池求解（None表示使用全部CPU），安装highspy时各进程内以上一小时的最优基热启动
+        self.max_workers = max_workers
+        # 各时段共用的PTDF矩阵、线性规划结构和节点负荷，首次计算时构建
+        # 拓扑不变时可传入已有的PTDF矩阵（如同一网络的多日仿真），不再重新分解
+        self._ptdf: Optional[PTDFMatrix] = ptdf
+        self._structure: Optional[_StructureCache] = None
+        self._elements: Optional[_ElementArrays] = None
+        self._node_demand: Optional[np.ndarray] = None
     
     def calculate_24h_lmp(self) -> Dict[int, Dict[str, float]]:
         """
         计算24小时的节点边际电价
         返回: {小时: {节点ID: LMP价格}}
         """
+        if self._node_demand is None:
+            self._build_static_structure()
+        
+        if self.max_workers != 1:
+            results = self._calculate_parallel_lmp()
+            self.hourly_results = results
+            return results
+        
+        # 全天各小时均无阻塞时，节点电价等于优先顺序出清的边际报价，无需求解线性规划
+        results = self._calculate_uncongested_lmp()
+        if results is not None:
+            self.hourly_results = results
+            return results
+        
+        # 各时段之间没有耦合约束，优先合并为一个块对角LP一次求解
+        results = self._calculate_batched_lmp()
+        if results is not None:
+            self.hourly_results = results
+            return results
+        
         results = {}
         
+        # 各小时拓扑相同：共享PTDF矩阵、元件属性数组和约束结构，并在安装highspy时以上一小时的最优基热启动
+        ptdf, structure, elements, node_demand = self._ptdf, self._structure, self._elements, self._node_demand
+        solver = HighsWarmStartSolver() if highspy is not None else None
+        
+        # 各小时共用基础网络和同一个算法实例，只替换该小时的机组容量和分段报价
+        gen_max = self.day_ahead_data.get_hourly_capacity()
+        lmp_algorithm = LMPAlgorithmWithSegments(self.day_ahead_data.network, ptdf=ptdf, solver=solver,
+                                                 structure=structure, elements=elements)
         for hour in range(24):
             print(f"正在计算第 {hour} 小时的LMP...")
             
-            # 获取该小时的网络状态
-            hourly_network = self.day_ahead_data.get_hourly_network(hour)
-            
-            # 获取该小时的分段报价数据
-            hourly_bids = self.day_ahead_data.get_hourly_bid_data(hour)
-            
-            # 创建LMP算法实例并计算
-            lmp_algorithm = LMPAlgorithmWithSegments(hourly_network, hourly_bids)
-            lmp_result = lmp_algorithm.calculate_lmp()
-            
-            results[hour] = lmp_result
+            lmp_algorithm.set_supply(gen_max[hour], self.day_ahead_data.get_hourly_bid_arrays(hour))
+            results[hour] = lmp_algorithm.calculate_lmp(node_demand[hour])
         
         self.hourly_results = results
         return results
-
-
-class LMPAlgorithmWithSegments(LMPAlgorithm):
-    """支持分段报价的LMP算法"""
     
-    def __init__(self, network: Network, bid_segments: Dict[str, List[BidSegment]] = None):
-        super().__init__(network, bid_segments)
-        self.bid_segments = bid_segments or {}
+    def _calculate_parallel_lmp(self) -> Dict[int, Dict[str, float]]:
+        """
+        各小时相互独立，按连续的小时段分发到进程池逐小时求解，每个进程在自己的小时段内热启动
+        """
+        print("正在并行计算24小时的LMP...")
+        data = self.day_ahead_data
+        bid_tensor = data.get_all_bid_tensor()
+        # 各小时共用的只读数据在进程初始化时序列化传入一次，任务只传小时下标
+        context = (data.network, self._ptdf, self._structure, self._elements, bid_tensor,
+                   data.get_hourly_bid_arrays(0)[3], data.get_hourly_capacity(), self._node_demand)
+        # 进程数不超过时段数，多余的进程只会增加启动开销
+        n_hours = len(bid_tensor)
+        workers = min(self.max_workers or os.cpu_count() or 1, n_hours)
+        blocks = [block.tolist() for block in np.array_split(np.arange(n_hours), workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context(), initializer=_init_worker,
+                                 initargs=(context,)) as executor:
+            return dict(enumerate(lmp for block in executor.map(_solve_hours, blocks) for lmp in block))
+    
+    @property
+    def ptdf(self) -> Optional[PTDFMatrix]:
+        """各时段共用的PTDF矩阵，首次计算后可传给同一网络的其他TimeSeriesLMPAlgorithm复用"""
+        return self._ptdf
     
-    def _build_optimization_problem(self) -> Tuple:
-        """构建考虑分段报价的优化问题"""
-        n_nodes = len(self.network.nodes)
-        n_gens = len(self.network.generators)
-        
-        # 为每台机组的每个报价段创建变量
-        gen_list = list(self.network.generators.values())
-        segments_info = []  # 存储分段信息
-        
-        # 计算总的优化变量数量
-        total_vars = 0
-        for gen in gen_list:
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 该发电机有分段报价
-                segments = self.bid_segments[gen.id]
-                segments_info.extend([(gen.id, i, seg) for i, seg in enumerate(segments)])
-                total_vars += len(segments)
-            else:
-                # 该发电机无分段报价（如新能源），使用单一变量
-                segments_info.append((gen.id, 0, None))  # None表示无分段
-                total_vars += 1
-        
-        # 目标函数系数（各段的报价）
-        c = np.zeros(total_vars)
-        
-        var_idx = 0
-        for gen_id, seg_idx, segment in segments_info:
-            if segment is not None:
-                # 有分段报价的机组
-                c[var_idx] = segment.price
-                var_idx += 1
-            else:
-                # 无分段报价的机组（新能源等）
-                gen = self.network.generators[gen_id]
-                c[var_idx] = gen.marginal_cost
-                var_idx += 1
-        
-        # 节点功率平衡约束
-        A_eq = np.zeros((n_nodes, total_vars))
-        b_eq = np.zeros(n_nodes)
-        
-        # 对每个节点建立功率平衡方程
-        var_idx = 0
-        for i, gen in enumerate(gen_list):
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 该发电机有分段报价
-                segments = self.bid_segments[gen.id]
-                node_idx = self.node_to_idx[gen.node_id]
-                
-                for j in range(len(segments)):
-                    A_eq[node_idx, var_idx + j] = 1.0
-                var_idx += len(segments)
-            else:
-                # 该发电机无分段报价
-                node_idx = self.node_to_idx[gen.node_id]
-                A_eq[node_idx, var_idx] = 1.0
-                var_idx += 1
+    def _calculate_uncongested_lmp(self) -> Optional[Dict[int, Dict[str, float]]]:
+        """
+        以分段报价张量一次完成24小时的优先顺序出清，再用PTDF校验各小时线路潮流
+        仅适用于单一电气岛且所有机组均有分段报价的情形；任一小时出现阻塞、供应不足
+        或边际价格不唯一时返回None，交由线性规划求解
+        """
+        data = self.day_ahead_data
+        bid_tensor = data.get_all_bid_tensor()
+        bid_counts = data.get_hourly_bid_arrays(0)[3]
+        if self._ptdf.n_islands != 1 or not len(bid_counts) or not (bid_counts > 0).all():
+            return None
         
-        # 获取该小时的负荷数据
-        for node_idx, node_id in self.idx_to_node.items():
-            node_loads = self.network.get_loads_at_node(node_id)
-            total_load = sum(load.demand for load in node_loads)
-            b_eq[node_idx] = total_load  # 负荷作为右端项
+        clearing_price, dispatch = merit_order_clear(bid_tensor, bid_counts, self._node_demand.sum(axis=1))
+        if np.isnan(clearing_price).any():
+            return None
         
-        # 发电机出力约束（各段容量限制）
-        bounds = []
-        var_idx = 0
-        for gen in gen_list:
-            if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                # 有分段报价的机组
-                segments = self.bid_segments[gen.id]
-                for seg in segments:
-                    bounds.append((0, seg.capacity()))
-                var_idx += len(segments)
-            else:
-                # 无分段报价的机组（新能源等）
-                bounds.append((gen.min_power, gen.max_power))
-                var_idx += 1
+        # 各小时节点净注入 [小时×节点] 与线路潮流 [小时×线路]
+        injection = -self._node_demand
+        np.add.at(injection, (slice(None), self._elements.gen_node_idx), dispatch.sum(axis=2))
+        flows = injection @ self._ptdf.matrix.T
+        if (np.abs(flows) >= self._ptdf.line_limits).any():
+            return None
         
-        # 检查供需平衡
-        total_gen_capacity = sum(b[1] for b in bounds if b[1] is not None)  # 上限总和
-        total_demand = sum(b_eq)
+        node_ids = list(data.network.nodes)
+        return {hour: dict.fromkeys(node_ids, price) for hour, price in enumerate(clearing_price.tolist())}
+    
+    def _calculate_batched_lmp(self) -> Optional[Dict[int, Dict[str, float]]]:
+        """
+        将24小时的出清问题合并为一个块对角线性规划一次求解
+        网络拓扑和报价段数各时段相同，约束矩阵只构建一次；各小时的目标函数和变量上下限
+        由分段报价张量一次生成，不再为每小时构建算法实例；求解失败时返回None
+        """
+        print("正在合并求解24小时的LMP...")
         
-        if total_gen_capacity < total_demand:
-            print(f"警告: 总发电容量({total_gen_capacity:.2f}MW)小于总需求({total_demand:.2f}MW)")
+        if self._node_demand is None:
+            self._build_static_structure()
         
-        return c, A_eq, b_eq, None, None, bounds
-    
-    def _calculate_simple_lmp(self) -> Dict[str, float]:
-        """计算简化的LMP（考虑分段报价）"""
-        lmp = {}
+        from scipy.optimize import linprog
         
-        for node_id in self.network.nodes.keys():
-            # 获取该节点的发电机
-            node_gens = [gen for gen in self.network.generators.values() if gen.node_id == node_id]
-            
-            # 获取该节点的负荷
-            node_loads = self.network.get_loads_at_node(node_id)
-            total_demand = sum(load.demand for load in node_loads)
-            
-            if not node_gens:
-                lmp[node_id] = 1000.0  # 没有发电机
-                continue
+        data = self.day_ahead_data
+        n_hours, n_nodes = self._node_demand.shape
+        try:
+            gen_max = data.get_hourly_capacity()
+            algorithm = LMPAlgorithmWithSegments(data.network, ptdf=self._ptdf, structure=self._structure,
+                                                 gen_max=gen_max[0], bid_arrays=data.get_hourly_bid_arrays(0),
+                                                 elements=self._elements)
+            _, A_eq, b_eq, A_ub, b_ub, _ = algorithm._build_optimization_problem(self._node_demand[0])
             
-            # 构建供应曲线
-            supply_curve = []
+            # 各小时的供应段价格和上下限 [小时×变量]，变量布局与单小时问题一致
+            prices, lower, upper = assemble_hourly_supply(data.get_all_bid_tensor(), data.get_hourly_bid_arrays(0)[3],
+                                                          algorithm._gen_cost, algorithm._gen_min, gen_max)
+            n_gen_vars = prices.shape[1]
+            n_vars = n_gen_vars + n_nodes
             
-            for gen in node_gens:
-                if gen.id in self.bid_segments and self.bid_segments[gen.id]:
-                    # 该发电机有分段报价
-                    segments = self.bid_segments[gen.id]
-                    for seg in segments:
-                        supply_curve.append((seg.price, seg.capacity()))
-                else:
-                    # 该发电机无分段报价，使用边际成本
-                    capacity = min(gen.max_power, total_demand)  # 简化的容量限制
-                    supply_curve.append((gen.marginal_cost, capacity))
+            c = np.zeros((n_hours, n_vars))
+            c[:, :n_gen_vars] = prices
+            bounds = np.empty((n_hours, n_vars, 2))
+            bounds[:, :n_gen_vars, 0] = lower
+            bounds[:, :n_gen_vars, 1] = upper
+            bounds[:, n_gen_vars:] = (-np.inf, np.inf)
+            b_eq_hours = np.zeros((n_hours, len(b_eq)))
+            b_eq_hours[:, :n_nodes] = self._node_demand
             
-            # 按价格排序供应曲线
-            supply_curve.sort(key=lambda x: x[0])
+            # 检查各小时供需平衡
+            capacity = np.where(np.isfinite(upper), upper, 0.0).sum(axis=1)
+            demand = self._node_demand.sum(axis=1)
+            for hour in np.flatnonzero(capacity < demand * algorithm._deficit_ratio).tolist():
+                print(f"警告: 第 {hour} 小时总发电容量({capacity[hour]:.2f}MW)"
+                      f"{algorithm._deficit_wording}总需求({demand[hour]:.2f}MW)")
             
-            # 计算满足需求的边际成本
-            cumulative_supply = 0.0
-            marginal_price = 0.0
-            
-            for price, capacity in supply_curve:
-                cumulative_supply += capacity
-                if cumulative_supply >= total_demand:
-                    marginal_price = price
-                    break
-            
-            if cumulative_supply < total_demand:
-                # 如果供应不足，设定高价格
-                marginal_price = max([x[0] for x in supply_curve]) + 500.0 if supply_curve else 800.0
-            
-            lmp[node_id] = marginal_price
+            result = linprog(
+                c=c.ravel(),
+                A_eq=_block_diag_hours([A_eq] * n_hours),
+                b_eq=b_eq_hours.ravel(),
+                A_ub=_block_diag_hours([A_ub] * n_hours),
+                b_ub=np.tile(b_ub, n_hours),
+                bounds=bounds.reshape(-1, 2),
+                method='highs-ds'
+            )
+        except Exception as e:
+            print(f"合并求解时出现异常: {e}")
+            return None
         
-        # 考虑网络约束的影响
-        self._adjust_lmp_for_network_constraints(lmp)
+        if not result.success:
+            print(f"合并求解失败: {result.message}，改为逐小时求解")
+            return None
         
-        return lmp
+        # 按各时段功率平衡约束的行数切分对偶变量
+        eq_marginals = result.eqlin.marginals.reshape(n_hours, len(b_eq))
+        return {hour: algorithm._lmp_from_duals(eq_marginals[hour]) for hour in range(n_hours)}
+    
+    def _build_static_structure(self):
+        """
+        以第0小时的网络和报价构建各时段共用的PTDF矩阵、元件属性数组和线性规划约束结构，并汇总各时段节点负荷
+        各时段只有报价、容量和负荷不同，报价段数变化的时段会自动重新构建结构
+        """
+        network = self.day_ahead_data.network
+        self._node_demand = self.day_ahead_data.get_hourly_node_demand()
+        if self._ptdf is None:
+            self._ptdf = build_ptdf(network, {node_id: idx for idx, node_id in enumerate(network.nodes.keys())})
+        algorithm = LMPAlgorithmWithSegments(network, ptdf=self._ptdf,
+                                             gen_max=self.day_ahead_data.get_hourly_capacity()[0],
+                                             bid_arrays=self.day_ahead_data.get_hourly_bid_arrays(0))
+        self._elements = algorithm.get_elements()
+        try:
+            self._structure = algorithm.get_structure()
+        except ValueError:
+            # 没有发电机时无法构建结构，由各时段自行处理
+            self._structure = None
+
+
+class LMPAlgorithmWithSegments(LMPAlgorithm):
+    """支持分段报价的LMP算法"""
+    
+    # 时序仿真中各时段容量已按新能源出力折算，容量低于需求即给出警告
+    _deficit_ratio = 1.0
+    _deficit_wording = "小于"
+
+
+def _block_diag_hours(blocks: List[sp.csr_matrix]) -> sp.csr_matrix:
+    """
+    将各时段的约束矩阵拼成块对角矩阵
+    各时段共享同一约束结构时以Kronecker积一次生成，否则逐块拼接
+    """
+    if all(block is blocks[0] for block in blocks):
+        return sp.kron(sp.identity(len(blocks), format='csr'), blocks[0], format='csr')
+    return sp.block_diag(blocks, format='csr')
+
+
+# 工作进程中各小时共用的只读数据，由_init_worker在进程启动时设置
+_worker_context: Optional[Tuple] = None
+
+
+def _pool_context():
+    """
+    进程池的启动方式：支持forkserver时使用forkserver，否则使用spawn
+    不使用fork：主进程中已启动的线程池（numba线程层、BLAS等）被fork复制后状态不一致，
+    可能使子进程死锁或解释器退出时挂起；macOS上fork本身也不安全
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_worker(context: Tuple):
+    """
+    进程池初始化：保存各小时共用的只读数据，
+    并让每个工作进程的BLAS/OpenMP只用单线程，避免多进程并行时线程数超过CPU核数
+    """
+    global _worker_context
+    _worker_context = context
+    if threadpool_limits is not None:
+        threadpool_limits(limits=1)
+
+
+def _solve_hours(hours: List[int]) -> List[Dict[str, float]]:
+    """
+    进程池工作函数：按顺序求解一段连续小时的LMP
+    同一小时段共用约束结构，安装highspy时以上一小时的最优基热启动
+    """
+    network, ptdf, structure, elements, bid_tensor, bid_counts, gen_max, node_demand = _worker_context
+    solver = HighsWarmStartSolver() if highspy is not None else None
+    algorithm = LMPAlgorithmWithSegments(network, ptdf=ptdf, solver=solver, structure=structure, elements=elements)
+    results = []
+    for hour in hours:
+        bids = bid_tensor[hour]
+        algorithm.set_supply(gen_max[hour], (bids[..., 0], bids[..., 1], bids[..., 2], bid_counts))
+        results.append(algorithm.calculate_lmp(node_demand[hour]))
+    return results
 
 
-def run_time_series_clearing(day_ahead_data: DayAheadMarketData) -> Dict[int, Dict[str, float]]:
+def run_time_series_clearing(day_ahead_data: DayAheadMarketData, max_workers: int = 1,
+                             ptdf: PTDFMatrix = None) -> Dict[int, Dict[str, float]]:
     """
     执行24小时时序现货出清
     :param day_ahead_data: 日前市场数据
+    :param max_workers: 逐小时并行求解的进程数，为1时串行出清，None表示使用全部CPU
+    :param ptdf: 可选的已有PTDF矩阵，网络拓扑与day_ahead_data相同时复用
     :return: 24小时各节点的边际电价
     """
-    algorithm = TimeSeriesLMPAlgorithm(day_ahead_data)
+    algorithm = TimeSeriesLMPAlgorithm(day_ahead_data, max_workers, ptdf=ptdf)
     return algorithm.calculate_24h_lmp()
\ No newline at end of file
@@ -2,22 +2,21 @@
 电力市场仿真成功示例
 展示一个发电容量充足、网络结构合理的例子，确保优化能够成功
 """
+import io
 import sys
-import os
+from functools import lru_cache
 
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+import numpy as np
 
-from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
+from power_market_simulator.models.network import Network, Node, Load, TransmissionLine, GeneratorType, GENERATOR_RECORD_DTYPE
 from power_market_simulator.models.time_series import create_sample_day_ahead_data, BidSegment
 from power_market_simulator.algorithms import create_spot_market_clearing
 from power_market_simulator.algorithms.time_series_lmp import run_time_series_clearing
 
 
-def create_balanced_network():
-    """创建平衡的网络，确保发电容量大于负荷需求"""
-    print("创建平衡的5节点网络...")
-    
+@lru_cache(maxsize=1)
+def _build_balanced_network():
+    """构建并冻结示例网络，结果在进程内缓存复用"""
     network = Network(name="Balanced5BusSystem")
     
     # 添加5个节点
@@ -28,80 +27,21 @@ def create_balanced_network():
     network.add_node(Node(id="DG", name="东莞节点", x=1, y=1))
     
     # 添加充足的发电机
-    # 广州节点 - 火电机组
-    network.add_generator(Generator(
-        id="GZ_G1", 
-        name="广州火电厂1", 
-        node_id="GZ", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=20.0, 
-        max_power=400.0, 
-        marginal_cost=280.0
-    ))
-    
-    # 深圳节点 - 火电机组
-    network.add_generator(Generator(
-        id="SZ_G1", 
-        name="深圳火电厂1", 
-        node_id="SZ", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=20.0, 
-        max_power=500.0, 
-        marginal_cost=300.0
-    ))
-    
-    # 珠海节点 - 水电机组和风电机组
-    network.add_generator(Generator(
-        id="ZH_G1", 
-        name="珠海水电厂1", 
-        node_id="ZH", 
-        generator_type=GeneratorType.HYDRO,
-        min_power=10.0, 
-        max_power=200.0, 
-        marginal_cost=180.0
-    ))
-    
-    network.add_generator(Generator(
-        id="ZH_G2", 
-        name="珠海风电场1", 
-        node_id="ZH", 
-        generator_type=GeneratorType.WIND,
-        min_power=0.0, 
-        max_power=150.0, 
-        marginal_cost=50.0
-    ))
-    
-    # 佛山节点 - 火电机组
-    network.add_generator(Generator(
-        id="FS_G1", 
-        name="佛山火电厂1", 
-        node_id="FS", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=20.0, 
-        max_power=300.0, 
-        marginal_cost=290.0
-    ))
-    
-    # 东莞节点 - 光伏机组和火电机组
-    network.add_generator(Generator(
-        id="DG_G1", 
-        name="东莞光伏电站1", 
-        node_id="DG", 
-        generator_type=GeneratorType.SOLAR,
-        min_power=0.0, 
-        max_power=100.0, 
-        marginal_cost=40.0
-    ))
-    
-    network.add_generator(Generator(
-        id="DG_G2", 
-        name="东莞火电厂1", 
-        node_id="DG", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=15.0, 
-        max_power=250.0, 
-        marginal_cost=310.0
-    ))
+    network.bulk_add_generators(np.array([
+        # (ID, 名称, 节点, 类型, 最小出力, 最大出力, 边际成本)
+        # 广州节点 - 火电机组
+        ("GZ_G1", "广州火电厂1", "GZ", GeneratorType.THERMAL, 20.0, 400.0, 280.0),
+        # 深圳节点 - 火电机组
+        ("SZ_G1", "深圳火电厂1", "SZ", GeneratorType.THERMAL, 20.0, 500.0, 300.0),
+        # 珠海节点 - 水电机组和风电机组
+        ("ZH_G1", "珠海水电厂1", "ZH", GeneratorType.HYDRO, 10.0, 200.0, 180.0),
+        ("ZH_G2", "珠海风电场1", "ZH", GeneratorType.WIND, 0.0, 150.0, 50.0),
+        # 佛山节点 - 火电机组
+        ("FS_G1", "佛山火电厂1", "FS", GeneratorType.THERMAL, 20.0, 300.0, 290.0),
+        # 东莞节点 - 光伏机组和火电机组
+        ("DG_G1", "东莞光伏电站1", "DG", GeneratorType.SOLAR, 0.0, 100.0, 40.0),
+        ("DG_G2", "东莞火电厂1", "DG", GeneratorType.THERMAL, 15.0, 250.0, 310.0),
+    ], dtype=GENERATOR_RECORD_DTYPE))
     
     # 添加负荷（确保总负荷小于总发电容量）
     network.add_load(Load(
@@ -185,14 +125,24 @@ def create_balanced_network():
         thermal_limit=250.0
     ))
     
+    return network.freeze()
+
+
+def create_balanced_network():
+    """创建平衡的网络，确保发电容量大于负荷需求"""
+    print("创建平衡的5节点网络...")
+    
+    # 示例网络在进程内共享，调用方不应原地修改
+    network = _build_balanced_network()
+    
     print(f"网络创建完成")
     print(f"节点数: {len(network.nodes)}")
     print(f"发电机数: {len(network.generators)}")
     print(f"负荷数: {len(network.loads)}")
     print(f"线路数: {len(network.lines)}")
     
-    total_gen_capacity = sum(g.max_power for g in network.generators.values())
-    total_load = sum(l.demand for l in network.loads.values())
+    total_gen_capacity = network.total_gen_capacity
+    total_load = network.total_load_demand
     print(f"总发电容量: {total_gen_capacity:.2f} MW")
     print(f"总负荷需求: {total_load:.2f} MW")
     print(f"容量充裕度: {total_gen_capacity/total_load:.2f} 倍")
@@ -252,9 +202,8 @@ def main():
         
         print("\n节点边际电价结果:")
         print("-" * 30)
-        for node_id, price in lmp_results.items():
-            node_name = network.nodes[node_id].name
-            print(f"  {node_id}({node_name}): {price:.2f} 元/MWh")
+        print("\n".join(f"  {node_id}({network.nodes[node_id].name}): {price:.2f} 元/MWh"
+                        for node_id, price in lmp_results.items()))
         
         print("\n现货出清计算成功!")
         
@@ -277,20 +226,25 @@ def main():
     print("-" * 30)
     
     # 显示特定小时的结果
-    import pdb; pdb.set_trace()
+    # 按网络节点顺序整理为(24, 节点数)的价格矩阵
+    node_ids = network.freeze().node_ids
+    price_mat = np.array([[hourly_results[h][node_id] for node_id in node_ids] for h in range(24)])
+    
+    # 报告先写入缓冲区，最后一次性输出
+    buf = io.StringIO()
     for hour in [6, 12, 18]:  # 早高峰、平段、晚高峰
-        print(f"\n{hour:02d}时节点电价:")
-        for node_id, price in hourly_results[hour].items():
-            node_name = network.nodes[node_id].name
-            print(f"  {node_id}({node_name}): {price:.2f} 元/MWh")
+        print(f"\n{hour:02d}时节点电价:", file=buf)
+        for i, node_id in enumerate(node_ids):
+            print(f"  {node_id}({network.node_names[i]}): {price_mat[hour, i]:.2f} 元/MWh", file=buf)
     
     # 计算各节点日平均价格
-    print(f"\n各节点日平均价格:")
-    for node_id in hourly_results[0].keys():
-        avg_price = sum(hourly_results[h][node_id] for h in range(24)) / 24
-        print(f"  {node_id}: {avg_price:.2f} 元/MWh")
+    avg_prices = price_mat.mean(axis=0)
     
-    print("\n24小时时序仿真演示成功完成!")
+    print("\n各节点日平均价格:", file=buf)
+    for node_id, avg_price in zip(node_ids, avg_prices):
+        print(f"  {node_id}: {avg_price:.2f} 元/MWh", file=buf)
+    print("\n24小时时序仿真演示成功完成!", file=buf)
+    sys.stdout.write(buf.getvalue())
 
 
 if __name__ == "__main__":
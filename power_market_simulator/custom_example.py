@@ -2,20 +2,19 @@
 自定义节点结构示例
 展示如何创建自定义的电力网络结构
 """
+import io
 import sys
-import os
+from functools import lru_cache
 
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+import numpy as np
 
-from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
+from power_market_simulator.models.network import Network, Node, Load, TransmissionLine, GeneratorType, GENERATOR_RECORD_DTYPE
 from power_market_simulator.algorithms import create_spot_market_clearing
 
 
-def create_custom_network():
-    """创建一个自定义的5节点网络模拟广东省电网"""
-    print("创建自定义5节点网络模拟...")
-    
+@lru_cache(maxsize=1)
+def _build_custom_network():
+    """构建并冻结示例网络，结果在进程内缓存复用"""
     # 创建5节点网络，模拟广东省主要城市
     network = Network(name="GuangdongPowerGrid")
     
@@ -27,70 +26,20 @@ def create_custom_network():
     network.add_node(Node(id="DG", name="东莞节点", x=1, y=1))
     
     # 添加不同类型和容量的发电机
-    # 广州节点
-    network.add_generator(Generator(
-        id="GZ_G1", 
-        name="广州电厂1", 
-        node_id="GZ", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=50.0, 
-        max_power=300.0, 
-        marginal_cost=280.0  # 火电边际成本
-    ))
-    
-    network.add_generator(Generator(
-        id="GZ_G2", 
-        name="广州电厂2", 
-        node_id="GZ", 
-        generator_type=GeneratorType.HYDRO,
-        min_power=30.0, 
-        max_power=150.0, 
-        marginal_cost=180.0  # 水电边际成本较低
-    ))
-    
-    # 深圳节点
-    network.add_generator(Generator(
-        id="SZ_G1", 
-        name="深圳电厂1", 
-        node_id="SZ", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=40.0, 
-        max_power=250.0, 
-        marginal_cost=300.0
-    ))
-    
-    # 珠海节点
-    network.add_generator(Generator(
-        id="ZH_G1", 
-        name="珠海电厂1", 
-        node_id="ZH", 
-        generator_type=GeneratorType.WIND,
-        min_power=0.0, 
-        max_power=120.0, 
-        marginal_cost=80.0  # 风电边际成本低
-    ))
-    
-    # 佛山节点
-    network.add_generator(Generator(
-        id="FS_G1", 
-        name="佛山电厂1", 
-        node_id="FS", 
-        generator_type=GeneratorType.THERMAL,
-        min_power=60.0, 
-        max_power=280.0, 
-        marginal_cost=290.0
-    ))
-    
-    # 东莞节点
-    network.add_generator(Generator(
-        id="DG_G1", 
-        name="东莞电厂1", 
-        node_id="DG", 
-        generator_type=GeneratorType.SOLAR,
-        min_power=0.0, 
-        max_power=100.0, 
-        marginal_cost=60.0  # 光伏边际成本最低
-    ))
+    network.bulk_add_generators(np.array([
+        # (ID, 名称, 节点, 类型, 最小出力, 最大出力, 边际成本)
+        # 广州节点
+        ("GZ_G1", "广州电厂1", "GZ", GeneratorType.THERMAL, 50.0, 300.0, 280.0),  # 火电边际成本
+        ("GZ_G2", "广州电厂2", "GZ", GeneratorType.HYDRO, 30.0, 150.0, 180.0),  # 水电边际成本较低
+        # 深圳节点
+        ("SZ_G1", "深圳电厂1", "SZ", GeneratorType.THERMAL, 40.0, 250.0, 300.0),
+        # 珠海节点
+        ("ZH_G1", "珠海电厂1", "ZH", GeneratorType.WIND, 0.0, 120.0, 80.0),  # 风电边际成本低
+        # 佛山节点
+        ("FS_G1", "佛山电厂1", "FS", GeneratorType.THERMAL, 60.0, 280.0, 290.0),
+        # 东莞节点
+        ("DG_G1", "东莞电厂1", "DG", GeneratorType.SOLAR, 0.0, 100.0, 60.0),  # 光伏边际成本最低
+    ], dtype=GENERATOR_RECORD_DTYPE))
     
     # 添加负荷（模拟各城市用电需求）
     network.add_load(Load(
@@ -183,6 +132,16 @@ def create_custom_network():
         thermal_limit=150.0
     ))
     
+    return network.freeze()
+
+
+def create_custom_network():
+    """创建一个自定义的5节点网络模拟广东省电网"""
+    print("创建自定义5节点网络模拟...")
+    
+    # 示例网络在进程内共享，调用方不应原地修改
+    network = _build_custom_network()
+    
     print(f"自定义网络创建完成")
     print(f"节点数: {len(network.nodes)}")
     print(f"发电机数: {len(network.generators)}")
@@ -194,50 +153,54 @@ def create_custom_network():
 
 def analyze_results(network, lmp_results):
     """分析出清结果"""
-    print("\n详细分析结果:")
-    print("=" * 50)
-    
-    total_demand = sum(load.demand for load in network.loads.values())
-    total_supply = sum(gen.max_power for gen in network.generators.values())
-    
-    print(f"总负荷需求: {total_demand:.2f} MW")
-    print(f"总发电能力: {total_supply:.2f} MW")
-    print(f"供需比: {total_demand/total_supply:.2f}")
-    
-    print("\n各节点详细信息:")
-    for node_id in network.nodes.keys():
-        node = network.nodes[node_id]
+    # 报告先写入缓冲区，最后一次性输出
+    buf = io.StringIO()
+    print("\n详细分析结果:", file=buf)
+    print("=" * 50, file=buf)
+    
+    total_demand = network.total_load_demand
+    total_supply = network.total_gen_capacity
+    
+    print(f"总负荷需求: {total_demand:.2f} MW", file=buf)
+    print(f"总发电能力: {total_supply:.2f} MW", file=buf)
+    print(f"供需比: {total_demand/total_supply:.2f}", file=buf)
+    
+    # 各节点发电容量和负荷由freeze()按节点汇总，元件列表来自网络的节点索引
+    network.freeze()
+    print("\n各节点详细信息:", file=buf)
+    for node_idx, (node_id, node) in enumerate(network.nodes.items()):
         gens = network.get_generators_at_node(node_id)
         loads = network.get_loads_at_node(node_id)
         
-        gen_capacity = sum(gen.max_power for gen in gens)
-        total_load = sum(load.demand for load in loads)
+        gen_capacity = network.arr_node_gen_capacity[node_idx]
+        total_load = network.arr_node_load_demand[node_idx]
         lmp = lmp_results[node_id]
         
-        print(f"\n节点 {node_id}({node.name}):")
-        print(f"  发电容量: {gen_capacity:.2f} MW")
-        print(f"  负荷需求: {total_load:.2f} MW")
-        print(f"  边际电价: {lmp:.2f} 元/MWh")
-        print(f"  发电机: {[(gen.id, gen.marginal_cost) for gen in gens]}")
-        print(f"  负荷: {[(load.id, load.demand) for load in loads]}")
+        print(f"\n节点 {node_id}({node.name}):", file=buf)
+        print(f"  发电容量: {gen_capacity:.2f} MW", file=buf)
+        print(f"  负荷需求: {total_load:.2f} MW", file=buf)
+        print(f"  边际电价: {lmp:.2f} 元/MWh", file=buf)
+        print(f"  发电机: {[(gen.id, gen.marginal_cost) for gen in gens]}", file=buf)
+        print(f"  负荷: {[(load.id, load.demand) for load in loads]}", file=buf)
         
         if gen_capacity < total_load:
-            print(f"  状态: 电力短缺 ({total_load - gen_capacity:.2f} MW)")
+            print(f"  状态: 电力短缺 ({total_load - gen_capacity:.2f} MW)", file=buf)
         elif gen_capacity > total_load * 1.5:  # 如果容量远大于负荷
-            print(f"  状态: 电力盈余")
+            print(f"  状态: 电力盈余", file=buf)
         else:
-            print(f"  状态: 供需基本平衡")
+            print(f"  状态: 供需基本平衡", file=buf)
     
     # 计算系统指标
-    avg_lmp = sum(lmp_results.values()) / len(lmp_results)
-    max_lmp = max(lmp_results.values())
-    min_lmp = min(lmp_results.values())
+    prices = np.fromiter(lmp_results.values(), dtype=np.float64, count=len(lmp_results))
+    avg_lmp, max_lmp, min_lmp, spread = prices.mean(), prices.max(), prices.min(), np.ptp(prices)
+    
+    print(f"\n系统指标:", file=buf)
+    print(f"  平均LMP: {avg_lmp:.2f} 元/MWh", file=buf)
+    print(f"  最高LMP: {max_lmp:.2f} 元/MWh", file=buf)
+    print(f"  最低LMP: {min_lmp:.2f} 元/MWh", file=buf)
+    print(f"  价格差异: {spread:.2f} 元/MWh", file=buf)
     
-    print(f"\n系统指标:")
-    print(f"  平均LMP: {avg_lmp:.2f} 元/MWh")
-    print(f"  最高LMP: {max_lmp:.2f} 元/MWh")
-    print(f"  最低LMP: {min_lmp:.2f} 元/MWh")
-    print(f"  价格差异: {max_lmp - min_lmp:.2f} 元/MWh")
+    sys.stdout.write(buf.getvalue())
 
 
 def main():
@@ -249,15 +212,17 @@ def main():
     network = create_custom_network()
     
     # 显示网络拓扑
-    print("\n网络拓扑结构:")
+    buf = io.StringIO()
+    print("\n网络拓扑结构:", file=buf)
     for node_id, node in network.nodes.items():
         connected_nodes = network.get_connected_nodes(node_id)
         gens = network.get_generators_at_node(node_id)
         loads = network.get_loads_at_node(node_id)
         
-        print(f"  {node_id}({node.name}) -> {connected_nodes}")
-        print(f"    发电机: {[(g.id, g.marginal_cost) for g in gens]}")
-        print(f"    负荷: {[(l.id, l.demand) for l in loads]}")
+        print(f"  {node_id}({node.name}) -> {connected_nodes}", file=buf)
+        print(f"    发电机: {[(g.id, g.marginal_cost) for g in gens]}", file=buf)
+        print(f"    负荷: {[(l.id, l.demand) for l in loads]}", file=buf)
+    sys.stdout.write(buf.getvalue())
     
     print("\n执行现货出清计算...")
     
@@ -270,9 +235,8 @@ def main():
         
         print("\n节点边际电价结果:")
         print("-" * 40)
-        for node_id, price in lmp_results.items():
-            node_name = network.nodes[node_id].name
-            print(f"  {node_id}({node_name}): {price:.2f} 元/MWh")
+        print("\n".join(f"  {node_id}({network.nodes[node_id].name}): {price:.2f} 元/MWh"
+                        for node_id, price in lmp_results.items()))
         
         # 分析结果
         analyze_results(network, lmp_results)
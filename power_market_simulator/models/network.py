@@ -2,21 +2,25 @@
 节点结构数据模型
 定义电力网络中的节点、发电机、负荷等基本元素
 """
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import List, Dict, Optional
-from enum import Enum
+from typing import List, Dict, MutableMapping, Optional
+from enum import IntEnum
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
 
 
-class GeneratorType(Enum):
-    """发电机类型"""
-    THERMAL = "thermal"  # 火电
-    HYDRO = "hydro"      # 水电
-    WIND = "wind"        # 风电
-    SOLAR = "solar"      # 光伏
+class GeneratorType(IntEnum):
+    """发电机类型（整数编码，可直接存入数组按类型筛选）"""
+    THERMAL = 0  # 火电
+    HYDRO = 1    # 水电
+    WIND = 2     # 风电
+    SOLAR = 3    # 光伏
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Node:
     """电网节点模型"""
     id: str
@@ -24,12 +28,9 @@ class Node:
     base_voltage: float = 220.0  # 基准电压(kV)
     x: float = 0.0  # 节点坐标x
     y: float = 0.0  # 节点坐标y
-    
-    def __hash__(self):
-        return hash(self.id)
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class Generator:
     """发电机模型"""
     id: str
@@ -42,12 +43,22 @@ class Generator:
     startup_cost: float = 0.0  # 启动成本
     shutdown_cost: float = 0.0  # 停机成本
     is_online: bool = True  # 是否在线
-    
-    def __hash__(self):
-        return hash(self.id)
 
 
-@dataclass
+# bulk_add_generators使用的发电机记录结构
+# 字符串字段使用object类型保存原始str，不按定长截断（截断会使长ID相互覆盖或指向不存在的节点）
+GENERATOR_RECORD_DTYPE = np.dtype([
+    ("id", "O"),
+    ("name", "O"),
+    ("node_id", "O"),
+    ("type", "i1"),
+    ("min_power", "f8"),
+    ("max_power", "f8"),
+    ("marginal_cost", "f8"),
+])
+
+
+@dataclass(eq=False, slots=True)
 class Load:
     """负荷模型"""
     id: str
@@ -55,12 +66,9 @@ class Load:
     node_id: str
     demand: float  # 负荷需求(MW)
     price_elasticity: float = 0.0  # 价格弹性
-    
-    def __hash__(self):
-        return hash(self.id)
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class TransmissionLine:
     """输电线路模型"""
     id: str
@@ -70,19 +78,16 @@ class TransmissionLine:
     reactance: float  # 电抗值(p.u.)
     thermal_limit: float  # 热稳定极限(MW)
     is_active: bool = True  # 是否有效
-    
-    def __hash__(self):
-        return hash(self.id)
 
 
 @dataclass
 class Network:
-    """电网网络结构"""
+    """电网网络结构，元件容器可以是dict或其他可变映射（如逐小时网络使用的ChainMap）"""
     name: str
-    nodes: Dict[str, Node] = None
-    generators: Dict[str, Generator] = None
-    loads: Dict[str, Load] = None
-    lines: Dict[str, TransmissionLine] = None
+    nodes: MutableMapping[str, Node] = None
+    generators: MutableMapping[str, Generator] = None
+    loads: MutableMapping[str, Load] = None
+    lines: MutableMapping[str, TransmissionLine] = None
     
     def __post_init__(self):
         if self.nodes is None:
@@ -93,37 +98,260 @@ class Network:
             self.loads = {}
         if self.lines is None:
             self.lines = {}
+        # 按节点索引的元件ID {类别: 索引}，首次查询时构建，之后由add_*增量维护
+        self._node_indexes = {}
+        # freeze()生成的数组是否需要重建
+        self._dirty = True
+        self._frozen_counts = None
+        self._float_dtype = np.dtype(np.float64)
+        # 构建B矩阵时的节点顺序和有效线路参数，用于判断能否复用LU分解
+        self._susceptance_key = None
+    
+    def __getstate__(self):
+        """
+        序列化（如传给spawn/forkserver方式启动的工作进程）时只保留元件字典，
+        freeze()生成的数组和B矩阵的LU分解（不可序列化）不随之传递，反序列化后调用freeze()时重建
+        """
+        state = {key: self.__dict__[key] for key in ("name", "nodes", "generators", "loads", "lines", "_float_dtype")}
+        state.update(_node_indexes={}, _dirty=True, _frozen_counts=None, _susceptance_key=None)
+        return state
+    
+    def _node_index(self, kind: str) -> Dict[str, list]:
+        """
+        获取按节点索引的元件，索引不存在时按当前字典构建
+        索引保存元件ID而不是对象，直接替换为同ID、同节点的元件后查询仍返回字典中的当前对象
+        发电机和负荷索引为 {节点ID: [元件ID]}，线路索引为邻接表 {节点ID: [(相邻节点ID, 线路ID)]}
+        """
+        index = self._node_indexes.get(kind)
+        if index is None:
+            index = defaultdict(list)
+            for comp in self._indexed_components(kind).values():
+                for node_id, entry in self._index_entries(comp):
+                    index[node_id].append(entry)
+            self._node_indexes[kind] = index
+        return index
+    
+    def _indexed_components(self, kind: str) -> MutableMapping:
+        """返回需要按节点索引的元件字典"""
+        if kind == "generators":
+            return self.generators
+        if kind == "loads":
+            return self.loads
+        return self.lines
+    
+    @staticmethod
+    def _index_entries(comp):
+        """元件在节点索引中的条目: [(节点ID, 条目)]"""
+        if isinstance(comp, TransmissionLine):
+            if comp.from_node == comp.to_node:
+                return [(comp.from_node, (comp.to_node, comp.id))]
+            return [(comp.from_node, (comp.to_node, comp.id)), (comp.to_node, (comp.from_node, comp.id))]
+        return [(comp.node_id, comp.id)]
+    
+    def _add_to_index(self, kind: str, comp, replaced: bool):
+        """新增元件时增量更新索引；覆盖已有ID的元件时使索引失效，下次查询时重建"""
+        index = self._node_indexes.get(kind)
+        if index is None:
+            return
+        if replaced:
+            del self._node_indexes[kind]
+            return
+        for node_id, entry in self._index_entries(comp):
+            index[node_id].append(entry)
+    
+    def invalidate_index(self):
+        """
+        使按节点的元件索引失效，下次查询时按当前字典重建
+        绕过add_*直接增删字典中的元件、替换为其他节点的元件或修改元件所在节点后需调用
+        """
+        self._node_indexes.clear()
     
     def add_node(self, node: Node):
         """添加节点"""
         self.nodes[node.id] = node
+        self._dirty = True
     
     def add_generator(self, generator: Generator):
         """添加发电机"""
+        replaced = generator.id in self.generators
         self.generators[generator.id] = generator
+        self._add_to_index("generators", generator, replaced)
+        self._dirty = True
+    
+    def bulk_add_generators(self, records):
+        """
+        批量添加发电机，records为GENERATOR_RECORD_DTYPE结构数组或同字段顺序的元组列表
+        一次性写入字典，按节点的索引在下次查询时统一重建
+        """
+        records = np.asarray(records, dtype=GENERATOR_RECORD_DTYPE)
+        self.generators.update(
+            (gen_id, Generator(id=gen_id, name=name, node_id=node_id, generator_type=GeneratorType(gen_type),
+                               min_power=min_power, max_power=max_power, marginal_cost=cost))
+            for gen_id, name, node_id, gen_type, min_power, max_power, cost in records.tolist()
+        )
+        self._node_indexes.pop("generators", None)
+        self._dirty = True
     
     def add_load(self, load: Load):
         """添加负荷"""
+        replaced = load.id in self.loads
         self.loads[load.id] = load
+        self._add_to_index("loads", load, replaced)
+        self._dirty = True
     
     def add_line(self, line: TransmissionLine):
         """添加输电线路"""
+        replaced = line.id in self.lines
         self.lines[line.id] = line
+        self._add_to_index("lines", line, replaced)
+        self._dirty = True
     
     def get_generators_at_node(self, node_id: str) -> List[Generator]:
         """获取指定节点的所有发电机"""
-        return [gen for gen in self.generators.values() if gen.node_id == node_id]
+        return [self.generators[gen_id] for gen_id in self._node_index("generators").get(node_id, ())]
     
     def get_loads_at_node(self, node_id: str) -> List[Load]:
         """获取指定节点的所有负荷"""
-        return [load for load in self.loads.values() if load.node_id == node_id]
+        return [self.loads[load_id] for load_id in self._node_index("loads").get(node_id, ())]
     
     def get_connected_nodes(self, node_id: str) -> List[str]:
         """获取与指定节点相连的节点"""
-        connected = []
-        for line in self.lines.values():
-            if line.from_node == node_id and line.is_active:
-                connected.append(line.to_node)
-            elif line.to_node == node_id and line.is_active:
-                connected.append(line.from_node)
-        return connected
\ No newline at end of file
+        return [neighbor for neighbor, line_id in self._node_index("lines").get(node_id, ())
+                if self.lines[line_id].is_active]
+    
+    @property
+    def total_gen_capacity(self) -> float:
+        """全网发电机最大出力之和(MW)，按字典中的当前属性计算"""
+        return float(np.fromiter((gen.max_power for gen in self.generators.values()), dtype=np.float64,
+                                 count=len(self.generators)).sum())
+    
+    @property
+    def total_load_demand(self) -> float:
+        """全网负荷需求之和(MW)，按字典中的当前属性计算"""
+        return float(np.fromiter((load.demand for load in self.loads.values()), dtype=np.float64,
+                                 count=len(self.loads)).sum())
+    
+    def freeze(self, force: bool = False, dtype=None) -> "Network":
+        """
+        将元件属性整理为按整数下标排列的NumPy数组（SoA），供出清算法直接做数组运算，
+        并构建节点导纳矩阵B_csc及其去除平衡节点后的LU分解B_lu
+        节点下标为节点在nodes中的顺序，各类元件的数组顺序与对应字典一致
+        通过add_*增减元件后再次调用时重建；直接修改元件属性后需以force=True调用
+        dtype指定元件参数数组的浮点类型，默认float64；传入np.float32可减半内存占用，
+        但出力、成本等参数只保留约7位有效数字。B矩阵及其LU分解始终按float64计算
+        """
+        if dtype is not None and np.dtype(dtype) != self._float_dtype:
+            self._float_dtype = np.dtype(dtype)
+            force = True
+        
+        counts = (len(self.nodes), len(self.generators), len(self.loads), len(self.lines))
+        if not force and not self._dirty and self._frozen_counts == counts:
+            return self
+        
+        self.node_ids = list(self.nodes)
+        self.node_idx = {node_id: idx for idx, node_id in enumerate(self.node_ids)}
+        self.node_names = np.array([node.name for node in self.nodes.values()])
+        node_idx = self.node_idx
+        float_dtype = self._float_dtype
+        
+        gens = list(self.generators.values())
+        n_gens = len(gens)
+        self.arr_gen_node_idx = np.fromiter((node_idx[gen.node_id] for gen in gens), dtype=np.int32, count=n_gens)
+        self.arr_gen_min = np.fromiter((gen.min_power for gen in gens), dtype=float_dtype, count=n_gens)
+        self.arr_gen_max = np.fromiter((gen.max_power for gen in gens), dtype=float_dtype, count=n_gens)
+        self.arr_gen_cost = np.fromiter((gen.marginal_cost for gen in gens), dtype=float_dtype, count=n_gens)
+        self.arr_gen_type = np.fromiter((gen.generator_type for gen in gens), dtype=np.int8, count=n_gens)
+        
+        loads = list(self.loads.values())
+        n_loads = len(loads)
+        self.arr_load_node_idx = np.fromiter((node_idx[load.node_id] for load in loads), dtype=np.int32, count=n_loads)
+        self.arr_load_demand = np.fromiter((load.demand for load in loads), dtype=float_dtype, count=n_loads)
+        
+        lines = list(self.lines.values())
+        n_lines = len(lines)
+        self.arr_line_from_idx = np.fromiter((node_idx[line.from_node] for line in lines), dtype=np.int32, count=n_lines)
+        self.arr_line_to_idx = np.fromiter((node_idx[line.to_node] for line in lines), dtype=np.int32, count=n_lines)
+        line_reactance = np.fromiter((line.reactance for line in lines), dtype=np.float64, count=n_lines)
+        line_b = 1.0 / line_reactance  # 线路电纳，B矩阵按float64构建
+        self.arr_line_reactance = line_reactance.astype(float_dtype, copy=False)
+        self.arr_line_b = line_b.astype(float_dtype, copy=False)
+        self.arr_line_limit = np.fromiter((line.thermal_limit for line in lines), dtype=float_dtype, count=n_lines)
+        self.arr_line_active = np.fromiter((line.is_active for line in lines), dtype=bool, count=n_lines)
+        
+        # 按节点和全网汇总的发电容量与负荷需求
+        n_nodes = len(node_idx)
+        node_gen_capacity = np.bincount(self.arr_gen_node_idx, weights=self.arr_gen_max, minlength=n_nodes)
+        node_load_demand = np.bincount(self.arr_load_node_idx, weights=self.arr_load_demand, minlength=n_nodes)
+        self.arr_node_gen_capacity = node_gen_capacity.astype(float_dtype, copy=False)
+        self.arr_node_load_demand = node_load_demand.astype(float_dtype, copy=False)
+        
+        # 有效线路的端点和电纳与上次相同时（如只改变了出力或负荷）沿用已有的B矩阵和LU分解
+        active = self.arr_line_active
+        from_idx, to_idx, b = self.arr_line_from_idx[active], self.arr_line_to_idx[active], line_b[active]
+        if not self._same_lines(self.node_ids, from_idx, to_idx, b):
+            self._build_susceptance(n_nodes, from_idx, to_idx, b)
+        
+        self._dirty = False
+        self._frozen_counts = counts
+        return self
+
+    def refresh(self) -> "Network":
+        """
+        直接修改元件属性后按当前属性重建数组，并使按节点的元件索引失效
+        有效线路未变化时不重新分解B矩阵
+        """
+        self.invalidate_index()
+        return self.freeze(force=True)
+    
+    def _build_susceptance(self, n_nodes: int, from_idx: np.ndarray, to_idx: np.ndarray, b: np.ndarray):
+        """构建节点导纳矩阵并识别电气岛，对去除平衡节点后的B矩阵做LU分解"""
+        # 节点导纳矩阵 B = Aᵀ·diag(b)·A（仅有效线路），以COO三元组一次构建
+        self.B_csc = sp.coo_matrix(
+            (np.concatenate([b, b, -b, -b]),
+             (np.concatenate([from_idx, to_idx, from_idx, to_idx]), np.concatenate([from_idx, to_idx, to_idx, from_idx]))),
+            shape=(n_nodes, n_nodes)
+        ).tocsc()
+        
+        # 每个电气岛的首个节点为平衡节点
+        self.B_n_islands, self.B_island_labels = connected_components(abs(self.B_csc), directed=False)
+        _, slack_idx = np.unique(self.B_island_labels, return_index=True)
+        self.B_non_slack = np.setdiff1d(np.arange(n_nodes), slack_idx)
+        self.B_lu = splu(self.B_csc[self.B_non_slack][:, self.B_non_slack].tocsc()) if len(self.B_non_slack) else None
+        self._susceptance_key = (list(self.node_ids), from_idx, to_idx, b)
+    
+    def _same_lines(self, node_ids: List[str], from_idx: np.ndarray, to_idx: np.ndarray, b: np.ndarray) -> bool:
+        """判断节点顺序和有效线路的端点、电纳是否与已构建的B矩阵一致"""
+        if self._susceptance_key is None:
+            return False
+        key_nodes, key_from, key_to, key_b = self._susceptance_key
+        return (key_nodes == node_ids and np.array_equal(key_from, from_idx)
+                and np.array_equal(key_to, to_idx) and np.array_equal(key_b, b))
+    
+    def dc_factor(self, node_ids: List[str], from_idx: np.ndarray, to_idx: np.ndarray, susceptance: np.ndarray):
+        """
+        若给定的节点顺序和有效线路与freeze()构建B矩阵时一致，
+        返回(B_csc, 电气岛数, 电气岛标签, 非平衡节点下标, LU分解)供直接复用，否则返回None
+        """
+        if not self._same_lines(node_ids, from_idx, to_idx, susceptance):
+            return None
+        return self.B_csc, self.B_n_islands, self.B_island_labels, self.B_non_slack, self.B_lu
+    
+    def compile_bids(self, bid_segments: Dict[str, list]):
+        """
+        将分段报价整理为按发电机下标排列、按最大段数补齐的二维数组
+        返回: (段起点, 段终点, 段价格, 各机组段数)，前三者形状为(发电机数, 最大段数)
+        行顺序与generators一致，没有报价的机组段数为0，补齐部分填0
+        """
+        gen_segments = [bid_segments.get(gen_id) or () for gen_id in self.generators]
+        n_seg = np.fromiter((len(segments) for segments in gen_segments), dtype=np.int32, count=len(gen_segments))
+        max_seg = int(n_seg.max()) if len(n_seg) else 0
+        
+        starts = np.zeros((len(gen_segments), max_seg))
+        ends = np.zeros((len(gen_segments), max_seg))
+        prices = np.zeros((len(gen_segments), max_seg))
+        mask = np.arange(max_seg) < n_seg[:, None]
+        flat = [seg for segments in gen_segments for seg in segments]
+        starts[mask] = [seg.start_power for seg in flat]
+        ends[mask] = [seg.end_power for seg in flat]
+        prices[mask] = [seg.price for seg in flat]
+        return starts, ends, prices, n_seg
@@ -2,15 +2,22 @@
 时间序列和分段报价数据模型
 扩展原有的网络模型以支持24小时动态仿真和分段报价
 """
-from dataclasses import dataclass
+from collections import ChainMap
+from dataclasses import dataclass, field, replace
 from typing import List, Dict, Optional, Tuple
 from enum import Enum
 import numpy as np
 from power_market_simulator.models.network import Network, Generator, Load, GeneratorType
 
 
+# 新能源机组类型：没有分段报价，可用容量随新能源出力因子变化
+_RENEWABLE_TYPES = frozenset({GeneratorType.WIND, GeneratorType.SOLAR})
+
+
 class BidSegment:
     """分段报价段"""
+    __slots__ = ('start_power', 'end_power', 'price')
+    
     def __init__(self, start_power: float, end_power: float, price: float):
         self.start_power = start_power  # 段起始出力(MW)
         self.end_power = end_power      # 段结束出力(MW)
@@ -21,7 +28,7 @@ class BidSegment:
         return self.end_power - self.start_power
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TimeSlot:
     """时间时段"""
     hour: int  # 小时(0-23)
@@ -29,56 +36,101 @@ class TimeSlot:
     renewable_factor: float = 1.0  # 新能源出力因子，用于调整新能源出力
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class GeneratorTimeSeries:
     """发电机时序数据"""
     generator_id: str
-    time_slots: List[TimeSlot]  # 24小时数据
-    bid_segments: List[List[BidSegment]]  # 每个时段的分段报价，对非新能源机组
+    load_factors: np.ndarray  # 24小时负荷因子
+    renewable_factors: np.ndarray  # 24小时新能源出力因子
+    bid_array: np.ndarray  # 每个时段的分段报价 [小时×段×(起始出力, 结束出力, 报价)]，新能源机组段数为0
     original_generator: Generator  # 原始发电机对象
+    _virtual_bids: Optional[List[List[BidSegment]]] = field(default=None, init=False, repr=False)  # 新能源24小时虚拟报价
+    
+    def invalidate(self):
+        """出力因子或原始发电机被修改后调用，清空缓存的新能源虚拟报价"""
+        self._virtual_bids = None
+    
+    @property
+    def time_slots(self) -> List[TimeSlot]:
+        """按时段对象形式返回24小时因子（兼容旧接口）"""
+        return [TimeSlot(hour=h, load_factor=lf, renewable_factor=rf)
+                for h, (lf, rf) in enumerate(zip(self.load_factors.tolist(), self.renewable_factors.tolist()))]
+    
+    @property
+    def is_renewable(self) -> bool:
+        """是否为新能源机组"""
+        return self.original_generator.generator_type in _RENEWABLE_TYPES
     
     def get_available_capacity(self, hour: int) -> float:
         """获取指定小时的可用容量"""
-        if hour < 0 or hour >= 24:
-            raise ValueError("小时必须在0-23之间")
+        assert 0 <= hour < 24, "小时必须在0-23之间"
         
-        time_slot = self.time_slots[hour]
-        
-        if self.original_generator.generator_type in [GeneratorType.WIND, GeneratorType.SOLAR]:
+        if self.is_renewable:
             # 新能源机组没有分段报价，出力由可再生能源因子决定
-            return self.original_generator.max_power * time_slot.renewable_factor
+            return self.original_generator.max_power * self.renewable_factors[hour]
         else:
             # 传统机组，返回最大出力
             return self.original_generator.max_power
     
     def get_bid_segments(self, hour: int) -> List[BidSegment]:
         """获取指定小时的分段报价"""
-        if hour < 0 or hour >= 24:
-            raise ValueError("小时必须在0-23之间")
+        assert 0 <= hour < 24, "小时必须在0-23之间"
         
-        if self.original_generator.generator_type in [GeneratorType.WIND, GeneratorType.SOLAR]:
-            # 新能源机组没有分段报价，返回虚拟报价
-            capacity = self.get_available_capacity(hour)
-            return [BidSegment(0, capacity, 0.0)]  # 新能源报价为0
+        if self.is_renewable:
+            # 新能源机组没有分段报价，返回报价为0的虚拟报价，24小时的结果首次调用时一次生成并缓存
+            # 调用方不应原地修改返回的列表
+            if self._virtual_bids is None:
+                capacities = (self.original_generator.max_power * np.asarray(self.renewable_factors)).tolist()
+                self._virtual_bids = [[BidSegment(0, capacity, 0.0)] for capacity in capacities]
+            return self._virtual_bids[hour]
         else:
             # 传统机组返回实际分段报价
-            return self.bid_segments[hour]
+            return [BidSegment(start, end, price) for start, end, price in self.bid_array[hour].tolist()]
+    
+    def get_bid_array(self, hour: int) -> np.ndarray:
+        """获取指定小时的分段报价数组 [段×(起始出力, 结束出力, 报价)]"""
+        return self.bid_array[hour]
 
 
-@dataclass
+@dataclass(eq=False, slots=True)
 class LoadTimeSeries:
     """负荷时序数据"""
     load_id: str
-    time_slots: List[TimeSlot]  # 24小时数据
+    load_factors: np.ndarray  # 24小时负荷因子
     original_load: Load  # 原始负荷对象
     
+    @property
+    def time_slots(self) -> List[TimeSlot]:
+        """按时段对象形式返回24小时因子（兼容旧接口）"""
+        return [TimeSlot(hour=h, load_factor=lf) for h, lf in enumerate(self.load_factors.tolist())]
+    
     def get_demand(self, hour: int) -> float:
         """获取指定小时的负荷需求"""
-        if hour < 0 or hour >= 24:
-            raise ValueError("小时必须在0-23之间")
+        assert 0 <= hour < 24, "小时必须在0-23之间"
         
-        time_slot = self.time_slots[hour]
-        return self.original_load.demand * time_slot.load_factor
+        return self.original_load.demand * self.load_factors[hour]
+
+
+@dataclass
+class HourlyNetworkView:
+    """
+    指定小时的网络快照：引用基础网络，只保存随小时变化的机组最大出力和负荷需求
+    max_power和demand分别按基础网络中generators和loads的顺序排列
+    """
+    base: Network  # 基础网络结构
+    hour: int
+    max_power: np.ndarray  # 各机组该小时的可用容量(MW)
+    demand: np.ndarray  # 各负荷该小时的需求(MW)
+    gen_idx: Dict[str, int]  # 机组ID到数组下标的映射
+    load_idx: Dict[str, int]  # 负荷ID到数组下标的映射
+    
+    def generator_max(self, gen_id: str) -> float:
+        """获取机组该小时的可用容量"""
+        return float(self.max_power[self.gen_idx[gen_id]])
+    
+    def load_demand(self, load_id: str) -> float:
+        """获取负荷该小时的需求"""
+        return float(self.demand[self.load_idx[load_id]])
 
 
 @dataclass
@@ -88,138 +140,247 @@ class DayAheadMarketData:
     generator_time_series: Dict[str, GeneratorTimeSeries]  # 发电机时序数据
     load_time_series: Dict[str, LoadTimeSeries]  # 负荷时序数据
     
+    def __post_init__(self):
+        self.invalidate()
+    
+    def invalidate(self):
+        """
+        时序数据或基础网络被修改后调用：重建逐小时容量和负荷表，并清空按小时缓存的网络和报价
+        """
+        self._hourly_net_cache: Dict[int, Network] = {}
+        self._hourly_bid_cache: Dict[int, Dict[str, List[BidSegment]]] = {}
+        for gen_ts in self.generator_time_series.values():
+            gen_ts.invalidate()
+        self._build_tables()
+    
+    @staticmethod
+    def _check_hour(hour: int):
+        """校验对外接口传入的小时，内部按小时的数组索引不再重复检查"""
+        if hour < 0 or hour >= 24:
+            raise ValueError("小时必须在0-23之间")
+    
+    def _build_tables(self):
+        """
+        将各机组的24小时可用容量和各负荷的24小时需求预先计算为二维数组 [元件×小时]，
+        按小时查询时只做数组索引
+        """
+        gen_series = list(self.generator_time_series.values())
+        self._gen_idx = {gen_id: idx for idx, gen_id in enumerate(self.generator_time_series)}
+        renewable_factors = np.array([gen_ts.renewable_factors for gen_ts in gen_series],
+                                     dtype=np.float64).reshape(len(gen_series), 24)
+        self._is_renewable = np.fromiter((gen_ts.is_renewable for gen_ts in gen_series), dtype=bool,
+                                         count=len(gen_series))
+        base_max = np.array([gen_ts.original_generator.max_power for gen_ts in gen_series], dtype=np.float64)
+        self._capacity = base_max[:, None] * np.where(self._is_renewable[:, None], renewable_factors, 1.0)
+        
+        load_series = list(self.load_time_series.values())
+        self._load_idx = {load_id: idx for idx, load_id in enumerate(self.load_time_series)}
+        load_factors = np.array([load_ts.load_factors for load_ts in load_series],
+                                dtype=np.float64).reshape(len(load_series), 24)
+        base_demand = np.array([load_ts.original_load.demand for load_ts in load_series], dtype=np.float64)
+        self._demand = base_demand[:, None] * load_factors
+        
+        # 按基础网络元件顺序排列的逐小时容量和需求 [小时×元件]，没有时序数据的元件保持原值
+        network_gens = list(self.network.generators.values())
+        self._network_gen_idx = {gen.id: idx for idx, gen in enumerate(network_gens)}
+        network_capacity = np.array([gen.max_power for gen in network_gens], dtype=np.float64)
+        self._network_capacity = np.tile(network_capacity, (24, 1))
+        for gen_id, row in self._gen_idx.items():
+            if gen_id in self._network_gen_idx:
+                self._network_capacity[:, self._network_gen_idx[gen_id]] = self._capacity[row]
+        
+        network_loads = list(self.network.loads.values())
+        self._network_load_idx = {load.id: idx for idx, load in enumerate(network_loads)}
+        network_demand = np.array([load.demand for load in network_loads], dtype=np.float64)
+        self._network_demand = np.tile(network_demand, (24, 1))
+        for load_id, row in self._load_idx.items():
+            if load_id in self._network_load_idx:
+                self._network_demand[:, self._network_load_idx[load_id]] = self._demand[row]
+        
+        # 逐小时网络中只有容量或需求与基础网络不同的元件需要重建（通常只有新能源机组），其余元件直接共享
+        # 以基础网络中的列下标记录，按小时取值时直接切片数组，不再按字符串ID查表
+        self._varying_gen_cols = np.flatnonzero((self._network_capacity != network_capacity).any(axis=0))
+        self._varying_gens = [network_gens[col] for col in self._varying_gen_cols.tolist()]
+        self._varying_load_cols = np.flatnonzero((self._network_demand != network_demand).any(axis=0))
+        self._varying_loads = [network_loads[col] for col in self._varying_load_cols.tolist()]
+        
+        # 按基础网络机组顺序排列的分段报价张量 [小时×机组×段×(起始出力, 结束出力, 报价)]，
+        # 新能源机组为一个报价为0、容量为该小时可用容量的虚拟段，不足最大段数的部分补0
+        seg_counts = [1 if gen_ts.is_renewable else gen_ts.bid_array.shape[1] for gen_ts in gen_series]
+        self._bid_counts = np.zeros(len(network_gens), dtype=np.int32)
+        self._bid_tensor = np.zeros((24, len(network_gens), max(seg_counts, default=0), 3))
+        for gen_id, row in self._gen_idx.items():
+            col = self._network_gen_idx.get(gen_id)
+            if col is None:
+                continue
+            gen_ts = gen_series[row]
+            if gen_ts.is_renewable:
+                self._bid_tensor[:, col, 0, 1] = self._capacity[row]
+            else:
+                self._bid_tensor[:, col, :seg_counts[row]] = gen_ts.bid_array
+            self._bid_counts[col] = seg_counts[row]
+    
+    def get_available_capacity(self, gen_id: str, hour: int) -> float:
+        """获取指定机组在指定小时的可用容量"""
+        self._check_hour(hour)
+        return float(self._capacity[self._gen_idx[gen_id], hour])
+    
+    def get_demand(self, load_id: str, hour: int) -> float:
+        """获取指定负荷在指定小时的需求"""
+        self._check_hour(hour)
+        return float(self._demand[self._load_idx[load_id], hour])
+    
+    def get_hourly_capacity(self) -> np.ndarray:
+        """获取24小时各机组可用容量 [小时×机组]，机组顺序与基础网络一致，调用方不应原地修改"""
+        return self._network_capacity
+    
+    def get_hourly_demand(self) -> np.ndarray:
+        """获取24小时各负荷需求 [小时×负荷]，负荷顺序与基础网络一致，调用方不应原地修改"""
+        return self._network_demand
+    
+    def get_hourly_view(self, hour: int) -> HourlyNetworkView:
+        """获取指定小时的网络快照，不复制网络元件"""
+        self._check_hour(hour)
+        return HourlyNetworkView(
+            base=self.network,
+            hour=hour,
+            max_power=self._network_capacity[hour],
+            demand=self._network_demand[hour],
+            gen_idx=self._network_gen_idx,
+            load_idx=self._network_load_idx
+        )
+    
     def get_hourly_network(self, hour: int) -> Network:
-        """获取指定小时的网络状态"""
-        # 创建基础网络的副本
+        """
+        获取指定小时的网络状态
+        结果按小时缓存，同一小时重复调用返回同一对象，调用方不应原地修改
+        """
+        self._check_hour(hour)
+        if hour in self._hourly_net_cache:
+            return self._hourly_net_cache[hour]
+        
+        # 以ChainMap叠加在基础网络的元件字典上，不复制字典：替换的元件写入前层，其余元件直接查基础网络
+        # 只替换已有ID的元件，迭代顺序与基础网络一致
         hourly_network = Network(
             name=f"{self.network.name}_H{hour:02d}",
-            nodes=self.network.nodes.copy(),
-            generators=self.network.generators.copy(),
-            loads=self.network.loads.copy(),
-            lines=self.network.lines.copy()
+            nodes=ChainMap({}, self.network.nodes),
+            generators=ChainMap({}, self.network.generators),
+            loads=ChainMap({}, self.network.loads),
+            lines=ChainMap({}, self.network.lines)
         )
         
-        # 更新发电机和负荷的时序数据
-        for gen_id, gen_ts in self.generator_time_series.items():
-            if gen_id in hourly_network.generators:
-                original_gen = hourly_network.generators[gen_id]
-                new_gen = Generator(
-                    id=original_gen.id,
-                    name=original_gen.name,
-                    node_id=original_gen.node_id,
-                    generator_type=original_gen.generator_type,
-                    min_power=original_gen.min_power,
-                    max_power=gen_ts.get_available_capacity(hour),  # 使用时序容量
-                    marginal_cost=original_gen.marginal_cost,
-                    startup_cost=original_gen.startup_cost,
-                    shutdown_cost=original_gen.shutdown_cost,
-                    is_online=original_gen.is_online
-                )
-                hourly_network.generators[gen_id] = new_gen
+        # 只重建该小时容量或需求与基础网络不同的元件，其余字段原样保留
+        capacities = self._network_capacity[hour, self._varying_gen_cols].tolist()
+        for original_gen, max_power in zip(self._varying_gens, capacities):
+            hourly_network.generators[original_gen.id] = replace(original_gen, max_power=max_power)
         
-        # 更新负荷数据
-        for load_id, load_ts in self.load_time_series.items():
-            if load_id in hourly_network.loads:
-                original_load = hourly_network.loads[load_id]
-                new_load = Load(
-                    id=original_load.id,
-                    name=original_load.name,
-                    node_id=original_load.node_id,
-                    demand=load_ts.get_demand(hour),  # 使用时序负荷
-                    price_elasticity=original_load.price_elasticity
-                )
-                hourly_network.loads[load_id] = new_load
+        demands = self._network_demand[hour, self._varying_load_cols].tolist()
+        for original_load, demand in zip(self._varying_loads, demands):
+            hourly_network.loads[original_load.id] = replace(original_load, demand=demand)
         
+        self._hourly_net_cache[hour] = hourly_network
         return hourly_network
     
+    def get_hourly_node_demand(self) -> np.ndarray:
+        """
+        获取24小时按节点汇总的负荷需求 [小时×节点]，节点顺序与网络中节点的顺序一致
+        负荷所在节点只查找一次，各时段只有需求值不同
+        """
+        node_to_idx = {node_id: idx for idx, node_id in enumerate(self.network.nodes.keys())}
+        load_node_idx = np.fromiter((node_to_idx[load.node_id] for load in self.network.loads.values()),
+                                    dtype=np.int32, count=len(self.network.loads))
+        
+        node_demand = np.zeros((24, len(node_to_idx)))
+        np.add.at(node_demand, (slice(None), load_node_idx), self._network_demand)
+        return node_demand
+    
+    def get_all_bid_tensor(self) -> np.ndarray:
+        """获取24小时分段报价张量 [小时×机组×段×(起始出力, 结束出力, 报价)]，机组顺序与基础网络一致"""
+        return self._bid_tensor
+    
+    def get_hourly_bid_arrays(self, hour: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        获取指定小时的分段报价数组，格式与Network.compile_bids相同：
+        (段起点, 段终点, 段价格, 各机组段数)，可直接传给LMPAlgorithm
+        """
+        self._check_hour(hour)
+        bids = self._bid_tensor[hour]
+        return bids[..., 0], bids[..., 1], bids[..., 2], self._bid_counts
+    
     def get_hourly_bid_data(self, hour: int) -> Dict[str, List[BidSegment]]:
-        """获取指定小时的分段报价数据"""
+        """获取指定小时的分段报价数据，结果按小时缓存"""
+        self._check_hour(hour)
+        if hour in self._hourly_bid_cache:
+            return self._hourly_bid_cache[hour]
+        
         bid_data = {}
         for gen_id, gen_ts in self.generator_time_series.items():
             bid_data[gen_id] = gen_ts.get_bid_segments(hour)
+        self._hourly_bid_cache[hour] = bid_data
         return bid_data
 
 
+def _sample_day_curves() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """示例日曲线：(负荷因子, 风电出力因子, 光伏出力因子)，各为24小时数组"""
+    h = np.arange(24)
+    night = (h >= 22) | (h <= 5)
+    
+    # 负荷因子，模拟日负荷曲线：早高峰、晚高峰、夜间低谷，其余为平段
+    load_factors = np.full(24, 0.8)
+    load_factors[(h >= 6) & (h <= 9)] = 0.95
+    load_factors[(h >= 17) & (h <= 21)] = 1.0
+    load_factors[night] = 0.6
+    
+    # 新能源出力因子：风电夜间出力较高，光伏白天出力
+    wind_factors = np.where(night, 0.8, 0.4)
+    solar_factors = np.where((h < 7) | (h > 19), 0.1, np.maximum(0.1, 0.2 + 0.7 * (1 - np.abs(h - 13) / 6)))
+    
+    # 各时序对象共享这些数组，设为只读
+    for curve in (load_factors, wind_factors, solar_factors):
+        curve.setflags(write=False)
+    return load_factors, wind_factors, solar_factors
+
+
 def create_sample_day_ahead_data(network: Network) -> DayAheadMarketData:
     """创建示例日前市场数据"""
     generator_time_series = {}
     load_time_series = {}
     
+    # 日曲线与机组无关，只计算一次，各时序对象共享
+    load_factors, wind_factors, solar_factors = _sample_day_curves()
+    renewable_curves = {GeneratorType.WIND: wind_factors, GeneratorType.SOLAR: solar_factors}
+    unit_factors = np.ones(24)  # 传统机组不受新能源因子影响
+    unit_factors.setflags(write=False)
+    
     # 为每个发电机创建24小时时序数据
     for gen_id, gen in network.generators.items():
-        # 创建24小时的时隙数据
-        time_slots = []
-        for h in range(24):
-            # 设置负荷因子，模拟日负荷曲线
-            if 6 <= h <= 9:  # 早高峰
-                load_factor = 0.95
-            elif 17 <= h <= 21:  # 晚高峰
-                load_factor = 1.0
-            elif 22 <= h or h <= 5:  # 夜间低谷
-                load_factor = 0.6
-            else:  # 平段
-                load_factor = 0.8
-            
-            # 设置新能源出力因子，模拟风光出力曲线
-            if gen.generator_type == GeneratorType.WIND:
-                # 风电夜间出力较高
-                renewable_factor = 0.8 if (22 <= h or h <= 5) else 0.4
-            elif gen.generator_type == GeneratorType.SOLAR:
-                # 光伏白天出力
-                renewable_factor = 0.1 if (h < 7 or h > 19) else max(0.1, 0.2 + 0.7 * (1 - abs(h - 13) / 6))
-            else:
-                renewable_factor = 1.0  # 传统机组不受影响
-            
-            time_slots.append(TimeSlot(
-                hour=h,
-                load_factor=load_factor,
-                renewable_factor=renewable_factor
-            ))
-        
-        # 创建分段报价（仅对非新能源机组）
-        bid_segments_list = []
-        for h in range(24):
-            if gen.generator_type in [GeneratorType.WIND, GeneratorType.SOLAR]:
-                # 新能源机组无分段报价
-                bid_segments_list.append([])
-            else:
-                # 为传统机组创建分段报价
-                # 模拟典型的3段报价
-                seg1 = BidSegment(0, gen.max_power * 0.3, gen.marginal_cost)
-                seg2 = BidSegment(gen.max_power * 0.3, gen.max_power * 0.7, gen.marginal_cost + 20)
-                seg3 = BidSegment(gen.max_power * 0.7, gen.max_power, gen.marginal_cost + 50)
-                bid_segments_list.append([seg1, seg2, seg3])
+        # 创建分段报价（仅对非新能源机组），各时段相同
+        if gen.generator_type in _RENEWABLE_TYPES:
+            # 新能源机组无分段报价
+            bid_array = np.empty((24, 0, 3))
+        else:
+            # 为传统机组创建分段报价，模拟典型的3段报价
+            p_max, cost = gen.max_power, gen.marginal_cost
+            segments = np.array([
+                [0.0, p_max * 0.3, cost],
+                [p_max * 0.3, p_max * 0.7, cost + 20],
+                [p_max * 0.7, p_max, cost + 50],
+            ])
+            bid_array = np.tile(segments, (24, 1, 1))
         
         generator_time_series[gen_id] = GeneratorTimeSeries(
             generator_id=gen_id,
-            time_slots=time_slots,
-            bid_segments=bid_segments_list,
+            load_factors=load_factors,
+            renewable_factors=renewable_curves.get(gen.generator_type, unit_factors),
+            bid_array=bid_array,
             original_generator=gen
         )
     
     # 为每个负荷创建24小时时序数据
     for load_id, load in network.loads.items():
-        time_slots = []
-        for h in range(24):
-            # 设置负荷因子，模拟日负荷曲线
-            if 6 <= h <= 9:  # 早高峰
-                load_factor = 0.95
-            elif 17 <= h <= 21:  # 晚高峰
-                load_factor = 1.0
-            elif 22 <= h or h <= 5:  # 夜间低谷
-                load_factor = 0.6
-            else:  # 平段
-                load_factor = 0.8
-            
-            time_slots.append(TimeSlot(
-                hour=h,
-                load_factor=load_factor,
-                renewable_factor=1.0  # 负荷不受新能源因子影响
-            ))
-        
         load_time_series[load_id] = LoadTimeSeries(
             load_id=load_id,
-            time_slots=time_slots,
+            load_factors=load_factors,
             original_load=load
         )
     
@@ -2,11 +2,7 @@
 现货出清系统测试用例
 """
 import unittest
-import sys
-import os
-
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
 
 from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
 from power_market_simulator.algorithms import create_spot_market_clearing
@@ -117,6 +113,156 @@ class TestSpotMarketClearing(unittest.TestCase):
         self.assertEqual(self.network.loads["L2"].node_id, "N2")
         self.assertEqual(self.network.loads["L3"].node_id, "N3")
     
+    def test_network_freeze(self):
+        """测试网络元件整理为数组"""
+        network = self.network.freeze()
+        self.assertIs(network, self.network)
+        self.assertEqual(network.node_ids, ["N1", "N2", "N3"])
+        self.assertEqual(list(network.node_names), ["Bus 1", "Bus 2", "Bus 3"])
+        np.testing.assert_array_equal(network.arr_gen_node_idx, [0, 1])
+        np.testing.assert_array_equal(network.arr_gen_cost, [30.0, 50.0])
+        np.testing.assert_array_equal(network.arr_load_demand, [80.0, 150.0, 70.0])
+        np.testing.assert_array_equal(network.arr_line_from_idx, [0, 1, 0])
+        np.testing.assert_allclose(network.arr_line_b, [10.0, 10.0, 1 / 0.15])
+        
+        # 节点导纳矩阵对称且各行之和为0
+        B = network.B_csc.toarray()
+        np.testing.assert_allclose(B, B.T)
+        np.testing.assert_allclose(B.sum(axis=1), 0.0, atol=1e-12)
+        self.assertEqual(list(network.B_non_slack), [1, 2])
+        
+        self.assertEqual(network.total_gen_capacity, 300.0)
+        np.testing.assert_array_equal(network.arr_node_gen_capacity, [100.0, 200.0, 0.0])
+        
+        # 新增元件后重建数组
+        self.network.add_load(Load(id="L4", name="Load 4", node_id="N2", demand=5.0))
+        np.testing.assert_array_equal(self.network.freeze().arr_load_node_idx, [0, 1, 2, 1])
+        self.assertEqual(self.network.total_load_demand, 305.0)
+        
+        # 参数数组可使用float32，B矩阵仍为float64
+        network = self.network.freeze(dtype=np.float32)
+        self.assertEqual(network.arr_gen_max.dtype, np.float32)
+        self.assertEqual(network.B_csc.dtype, np.float64)
+        self.assertEqual(network.total_gen_capacity, 300.0)
+        self.assertEqual(network.arr_load_demand.dtype, np.float32)
+        
+        # 全网汇总值读取字典中的当前属性，直接修改元件属性后无需重建数组
+        self.network.loads["L4"].demand = 15.0
+        self.network.generators["G1"].max_power = 120.0
+        self.assertEqual(self.network.total_load_demand, 315.0)
+        self.assertEqual(self.network.total_gen_capacity, 320.0)
+    
+    def test_compile_bids(self):
+        """测试分段报价整理为补齐数组"""
+        from power_market_simulator.models.time_series import BidSegment
+        
+        bids = {"G2": [BidSegment(0, 100, 40.0), BidSegment(100, 200, 60.0)]}
+        starts, ends, prices, n_seg = self.network.compile_bids(bids)
+        self.assertEqual(starts.shape, (2, 2))
+        np.testing.assert_array_equal(n_seg, [0, 2])
+        np.testing.assert_array_equal(ends, [[0.0, 0.0], [100.0, 200.0]])
+        np.testing.assert_array_equal(prices, [[0.0, 0.0], [40.0, 60.0]])
+    
+    def test_bulk_add_generators(self):
+        """测试批量添加发电机"""
+        self.network.get_generators_at_node("N3")  # 先建立索引
+        self.network.bulk_add_generators([
+            ("G3", "Gen 3", "N3", GeneratorType.WIND, 0.0, 40.0, 0.0),
+            ("G4", "Gen 4", "N3", GeneratorType.SOLAR, 0.0, 20.0, 0.0),
+        ])
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N3")], ["G3", "G4"])
+        self.assertIs(self.network.generators["G4"].generator_type, GeneratorType.SOLAR)
+        self.assertEqual(self.network.total_gen_capacity, 360.0)
+        
+        # 超过32个字符的ID不被截断，只在末尾不同的ID互不覆盖
+        long_ids = ["Wind_Farm_Unit_" + "x" * 40 + suffix for suffix in ("A", "B")]
+        self.network.bulk_add_generators([(gen_id, gen_id, "N3", GeneratorType.WIND, 0.0, 10.0, 0.0)
+                                          for gen_id in long_ids])
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N3")], ["G3", "G4"] + long_ids)
+        self.assertEqual(self.network.generators[long_ids[1]].name, long_ids[1])
+    
+    def test_dc_lmp_kernel(self):
+        """测试直流出清内核的优先顺序调度与阻塞判断"""
+        from power_market_simulator.algorithms.network_kernels import solve_dc_lmp
+        
+        # 两节点一条线路，平衡节点为节点0，节点1注入经线路流向节点0
+        ptdf = np.array([[0.0, -1.0]])
+        price = np.array([30.0, 50.0])
+        lower = np.zeros(2)
+        upper = np.array([100.0, 100.0])
+        node_idx = np.array([0, 1], dtype=np.int32)
+        demand = np.array([0.0, 120.0])
+        
+        lmp, dispatch = solve_dc_lmp(price, lower, upper, node_idx, demand, ptdf, np.array([200.0]))
+        np.testing.assert_array_equal(lmp, [50.0, 50.0])
+        np.testing.assert_array_equal(dispatch, [100.0, 20.0])
+        
+        # 线路极限低于所需潮流时交由线性规划
+        lmp, _ = solve_dc_lmp(price, lower, upper, node_idx, demand, ptdf, np.array([80.0]))
+        self.assertEqual(len(lmp), 0)
+        
+        # 需求恰好落在段边界
+        lmp, _ = solve_dc_lmp(price, lower, upper, node_idx, np.array([0.0, 100.0]), ptdf, np.array([200.0]))
+        self.assertEqual(len(lmp), 0)
+    
+    def test_ptdf_reuses_frozen_factor(self):
+        """测试PTDF构建复用冻结网络的LU分解，线路变化后重新分解"""
+        from power_market_simulator.algorithms.lmp_algorithm import build_ptdf
+        
+        node_to_idx = {"N1": 0, "N2": 1, "N3": 2}
+        expected = build_ptdf(self.network, node_to_idx).matrix
+        lu = self.network.freeze().B_lu
+        np.testing.assert_allclose(build_ptdf(self.network, node_to_idx).matrix, expected, atol=1e-12)
+        
+        # 只修改负荷时沿用原有分解
+        self.network.loads["L1"].demand = 90.0
+        self.assertIs(self.network.refresh().B_lu, lu)
+        
+        # 修改线路电抗后冻结数据不再匹配，PTDF按当前参数计算
+        self.network.lines["L13"].reactance = 0.3
+        self.assertIsNone(self.network.dc_factor(list(node_to_idx), np.array([0, 1, 0]), np.array([1, 2, 2]),
+                                                 np.array([10.0, 10.0, 1 / 0.3])))
+        self.assertFalse(np.allclose(build_ptdf(self.network, node_to_idx).matrix, expected))
+        self.assertIsNot(self.network.refresh().B_lu, lu)
+    
+    def test_node_index(self):
+        """测试按节点查询发电机、负荷和相邻节点"""
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N2")], ["G2"])
+        self.assertEqual(sorted(self.network.get_connected_nodes("N1")), ["N2", "N3"])
+        
+        # 通过add_*新增元件后索引同步更新
+        self.network.add_load(Load(id="L4", name="Load 4", node_id="N1", demand=5.0))
+        self.assertEqual([load.id for load in self.network.get_loads_at_node("N1")], ["L1", "L4"])
+        
+        # 直接替换字典中的元件时返回当前对象
+        self.network.loads["L4"] = Load(id="L4", name="Load 4", node_id="N1", demand=8.0)
+        self.assertEqual(self.network.get_loads_at_node("N1")[1].demand, 8.0)
+        
+        # 直接向字典添加元件后使索引失效即可查到
+        self.network.generators["G3"] = Generator(
+            id="G3", name="Gen 3", node_id="N2", generator_type=GeneratorType.WIND,
+            min_power=0.0, max_power=10.0, marginal_cost=0.0
+        )
+        self.network.invalidate_index()
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N2")], ["G2", "G3"])
+        
+        # 元件数不变、替换为其他节点的元件后按新节点查询
+        self.network.generators["G1"] = Generator(
+            id="G1", name="Gen 1", node_id="N3", generator_type=GeneratorType.THERMAL,
+            min_power=0.0, max_power=100.0, marginal_cost=30.0
+        )
+        self.network.invalidate_index()
+        self.assertEqual(self.network.get_generators_at_node("N1"), [])
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N3")], ["G1"])
+        
+        # 通过add_generator覆盖同ID元件时索引自动重建
+        self.network.add_generator(Generator(
+            id="G1", name="Gen 1", node_id="N1", generator_type=GeneratorType.THERMAL,
+            min_power=0.0, max_power=100.0, marginal_cost=30.0
+        ))
+        self.assertEqual([gen.id for gen in self.network.get_generators_at_node("N1")], ["G1"])
+        self.assertEqual(self.network.get_generators_at_node("N3"), [])
+    
     def test_spot_market_clearing_creation(self):
         """测试现货市场出清实例创建"""
         clearing = create_spot_market_clearing(self.network)
@@ -201,6 +347,99 @@ class TestSpotMarketClearing(unittest.TestCase):
         self.assertIn("N1", algorithm.node_to_idx)
         self.assertIn("N2", algorithm.node_to_idx)
 
+    
+    def test_ptdf_matrix(self):
+        """测试PTDF矩阵构建"""
+        from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm
+        algorithm = LMPAlgorithm(self.network)
+        ptdf = algorithm.ptdf
+        
+        self.assertEqual(ptdf.matrix.shape, (3, 3))
+        self.assertEqual(ptdf.n_islands, 1)
+        
+        # 平衡节点N1的注入不产生潮流
+        self.assertTrue((ptdf.matrix[:, algorithm.node_to_idx["N1"]] == 0).all())
+        
+        # N2注入、N1吸收时，线路1-2反向潮流与1-3-2路径潮流之和等于注入功率
+        n2 = algorithm.node_to_idx["N2"]
+        line_ids = list(self.network.lines.keys())
+        flow_12 = ptdf.matrix[line_ids.index("L12"), n2]
+        flow_13 = ptdf.matrix[line_ids.index("L13"), n2]
+        self.assertAlmostEqual(-flow_12 - flow_13, 1.0)
+
+    
+    def test_lmp_from_duals(self):
+        """测试由功率平衡约束对偶变量得到的节点电价"""
+        from power_market_simulator.algorithms.lmp_algorithm import run_clearing
+        
+        # 3节点系统总容量300MW恰好等于总负荷，边际机组为G2
+        results = run_clearing(self.network)
+        self.assertEqual(set(results.keys()), {"N1", "N2", "N3"})
+        
+        # 降低负荷后线路不阻塞，全网电价等于G2的边际成本
+        self.network.loads["L2"].demand = 100.0
+        results = run_clearing(self.network)
+        for node_id, price in results.items():
+            self.assertAlmostEqual(price, 50.0, places=6, msg=f"节点 {node_id}")
+
+    
+    def test_congestion_component(self):
+        """测试节点电价分解为电能分量和阻塞分量"""
+        from scipy.optimize import linprog
+        from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm
+        
+        # 负荷集中在N3，线路1-3阻塞
+        self.network.loads["L1"].demand = 0.0
+        self.network.loads["L2"].demand = 20.0
+        self.network.loads["L3"].demand = 100.0
+        self.network.lines["L13"].thermal_limit = 50.0
+        
+        algorithm = LMPAlgorithm(self.network)
+        c, A_eq, b_eq, A_ub, b_ub, bounds = algorithm._build_optimization_problem()
+        result = linprog(c=c, A_eq=A_eq, b_eq=b_eq, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method='highs')
+        self.assertTrue(result.success)
+        
+        energy, congestion = algorithm._lmp_components(result)
+        n_nodes = len(self.network.nodes)
+        np.testing.assert_allclose(energy + congestion, result.eqlin.marginals[:n_nodes], atol=1e-6)
+        
+        lmp = algorithm.calculate_lmp()
+        self.assertAlmostEqual(lmp["N1"], 30.0, places=6)
+        self.assertAlmostEqual(lmp["N2"], 50.0, places=6)
+        self.assertAlmostEqual(lmp["N3"], 70.0, places=6)
+        self.assertGreater(lmp["N3"] - energy[algorithm.node_to_idx["N3"]], 0.0)
+
+    
+    def test_repeated_demand_override(self):
+        """测试同一算法实例以不同负荷重复出清"""
+        from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm
+        
+        algorithm = LMPAlgorithm(self.network)
+        full_load = algorithm.calculate_lmp()
+        light_load = algorithm.calculate_lmp(demand_override=np.array([0.0, 50.0, 50.0]))
+        for price in light_load.values():
+            self.assertAlmostEqual(price, 30.0, places=6)
+        self.assertEqual(algorithm.calculate_lmp(), full_load)
+
+    
+    def test_tiny_network_fast_path(self):
+        """测试小规模网络快速出清与线性规划结果一致"""
+        from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm
+        
+        algorithm = LMPAlgorithm(self.network)
+        demand = np.array([20.0, 60.0, 40.0])
+        fast = algorithm._tiny_lmp(demand)
+        self.assertIsNotNone(fast)
+        
+        algorithm._TINY_MAX_VARS = 0  # 关闭快速路径
+        solved = algorithm.calculate_lmp(demand_override=demand)
+        for node_id, price in solved.items():
+            self.assertAlmostEqual(fast[node_id], price, places=6)
+        
+        # 线路阻塞时不走快速路径
+        self.network.lines["L13"].thermal_limit = 10.0
+        self.assertIsNone(LMPAlgorithm(self.network)._tiny_lmp(demand))
+
 
 def run_tests():
     """运行所有测试"""
@@ -1,17 +1,18 @@
 """
 时序仿真测试用例
 """
-import unittest
-import sys
 import os
-
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import subprocess
+import sys
+import textwrap
+import unittest
+import numpy as np
 
 from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
 from power_market_simulator.models.time_series import create_sample_day_ahead_data, BidSegment
-from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm, run_clearing
-from power_market_simulator.algorithms.time_series_lmp import run_time_series_clearing
+from scipy.optimize import linprog
+from power_market_simulator.algorithms.lmp_algorithm import LMPAlgorithm, HighsWarmStartSolver, run_clearing, highspy
+from power_market_simulator.algorithms.time_series_lmp import run_time_series_clearing, TimeSeriesLMPAlgorithm
 
 
 class TestTimeSeriesSimulation(unittest.TestCase):
@@ -126,6 +127,19 @@ class TestTimeSeriesSimulation(unittest.TestCase):
         for load_ts in day_ahead_data.load_time_series.values():
             self.assertEqual(len(load_ts.time_slots), 24)
         
+        # 分段报价以数组保存，按需转换为报价段对象
+        thermal_ts = day_ahead_data.generator_time_series["G1"]
+        self.assertEqual(thermal_ts.bid_array.shape, (24, 3, 3))
+        segments = thermal_ts.get_bid_segments(8)
+        self.assertEqual([seg.price for seg in segments], list(thermal_ts.get_bid_array(8)[:, 2]))
+        self.assertEqual(segments[-1].end_power, self.network.generators["G1"].max_power)
+        
+        # 新能源机组的虚拟报价只生成一次
+        wind_ts = day_ahead_data.generator_time_series["G2"]
+        self.assertIs(wind_ts.get_bid_segments(12), wind_ts.get_bid_segments(12))
+        self.assertAlmostEqual(wind_ts.get_bid_segments(12)[0].end_power, wind_ts.get_available_capacity(12))
+        self.assertEqual(wind_ts.get_bid_segments(12)[0].price, 0.0)
+        
         print("日前数据创建成功")
     
     def test_hourly_network_extraction(self):
@@ -146,8 +160,106 @@ class TestTimeSeriesSimulation(unittest.TestCase):
         # 风电机组容量应根据时序因子调整
         self.assertLessEqual(hourly_gen.max_power, original_gen.max_power)
         
+        # 火电机组容量不随小时变化，直接共享基础网络中的对象
+        self.assertIs(hourly_network.generators["G1"], self.network.generators["G1"])
+        
         print(f"第12小时风电机组容量: {hourly_gen.max_power} MW (原容量: {original_gen.max_power} MW)")
     
+    def test_hourly_view(self):
+        """测试小时网络快照与逐小时重建的网络一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        for hour in (3, 12):
+            view = day_ahead_data.get_hourly_view(hour)
+            hourly_network = day_ahead_data.get_hourly_network(hour)
+            self.assertIs(view.base, self.network)
+            self.assertEqual(list(view.max_power), [gen.max_power for gen in hourly_network.generators.values()])
+            self.assertEqual(view.load_demand("L1"), hourly_network.loads["L1"].demand)
+        
+        with self.assertRaises(ValueError):
+            day_ahead_data.get_hourly_view(-1)
+    
+    def test_hourly_cache_invalidate(self):
+        """测试按小时缓存的网络和报价，修改时序数据后失效"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        self.assertIs(day_ahead_data.get_hourly_network(5), day_ahead_data.get_hourly_network(5))
+        self.assertIs(day_ahead_data.get_hourly_bid_data(5), day_ahead_data.get_hourly_bid_data(5))
+        
+        cached = day_ahead_data.get_hourly_network(5)
+        day_ahead_data.load_time_series["L1"].original_load = Load(id="L1", name="Load 1", node_id="N1", demand=10.0)
+        day_ahead_data.invalidate()
+        hourly_network = day_ahead_data.get_hourly_network(5)
+        self.assertIsNot(hourly_network, cached)
+        self.assertAlmostEqual(hourly_network.loads["L1"].demand, 10.0 * 0.6)
+    
+    def test_bid_tensor(self):
+        """测试分段报价张量与逐小时报价字典整理的结果一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        n_seg = max(ts.bid_array.shape[1] for ts in day_ahead_data.generator_time_series.values())
+        self.assertEqual(day_ahead_data.get_all_bid_tensor().shape, (24, len(self.network.generators), n_seg, 3))
+        for hour in (2, 13):
+            expected = self.network.compile_bids(day_ahead_data.get_hourly_bid_data(hour))
+            for actual, wanted in zip(day_ahead_data.get_hourly_bid_arrays(hour), expected):
+                np.testing.assert_array_equal(actual, wanted)
+    
+    def test_hourly_supply_assembly(self):
+        """测试由报价张量一次生成的各小时供应段系数与逐小时构建的结果一致"""
+        from power_market_simulator.algorithms.network_kernels import assemble_hourly_supply
+        
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        gen_max = day_ahead_data.get_hourly_capacity()
+        first = LMPAlgorithm(self.network, gen_max=gen_max[0], bid_arrays=day_ahead_data.get_hourly_bid_arrays(0))
+        prices, lower, upper = assemble_hourly_supply(day_ahead_data.get_all_bid_tensor(),
+                                                      day_ahead_data.get_hourly_bid_arrays(0)[3],
+                                                      first._gen_cost, first._gen_min, gen_max)
+        for hour in (0, 12):
+            hourly = LMPAlgorithm(self.network, gen_max=gen_max[hour],
+                                  bid_arrays=day_ahead_data.get_hourly_bid_arrays(hour))
+            _, expected_prices, expected_lower, expected_upper, _ = hourly._collect_supply()
+            np.testing.assert_array_equal(prices[hour], expected_prices)
+            np.testing.assert_array_equal(lower[hour], expected_lower)
+            np.testing.assert_array_equal(upper[hour], expected_upper)
+    
+    def test_merit_order_kernel(self):
+        """测试24小时优先顺序出清内核"""
+        from power_market_simulator.algorithms._merit_order import merit_order_clear
+        
+        # 两台机组：机组0两段(0-50 @20, 50-100 @40)，机组1一段(0-80 @30)
+        bid_tensor = np.zeros((3, 2, 2, 3))
+        bid_tensor[:, 0] = [[0.0, 50.0, 20.0], [50.0, 100.0, 40.0]]
+        bid_tensor[:, 1, 0] = [0.0, 80.0, 30.0]
+        prices, dispatch = merit_order_clear(bid_tensor, np.array([2, 1], dtype=np.int32), np.array([40.0, 100.0, 130.0]))
+        
+        np.testing.assert_array_equal(prices[:2], [20.0, 30.0])
+        np.testing.assert_array_equal(dispatch[1], [[50.0, 0.0], [50.0, 0.0]])
+        self.assertTrue(np.isnan(prices[2]))  # 需求恰好落在段边界
+    
+    def test_hourly_node_demand(self):
+        """测试24小时节点负荷汇总与逐小时网络一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        node_demand = day_ahead_data.get_hourly_node_demand()
+        self.assertEqual(node_demand.shape, (24, len(self.network.nodes)))
+        
+        for hour in (0, 8, 18):
+            hourly_network = day_ahead_data.get_hourly_network(hour)
+            for idx, node_id in enumerate(hourly_network.nodes):
+                expected = sum(load.demand for load in hourly_network.get_loads_at_node(node_id))
+                self.assertAlmostEqual(node_demand[hour, idx], expected, places=9)
+    
+    def test_hourly_capacity_tables(self):
+        """测试预计算的容量和负荷表与各时序对象一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        for hour in range(24):
+            for gen_id, gen_ts in day_ahead_data.generator_time_series.items():
+                self.assertEqual(day_ahead_data.get_available_capacity(gen_id, hour), gen_ts.get_available_capacity(hour))
+            for load_id, load_ts in day_ahead_data.load_time_series.items():
+                self.assertEqual(day_ahead_data.get_demand(load_id, hour), load_ts.get_demand(hour))
+        
+        # 24小时整表按基础网络元件顺序排列，每行与该小时的网络快照一致
+        self.assertEqual(day_ahead_data.get_hourly_capacity().shape, (24, len(self.network.generators)))
+        self.assertEqual(day_ahead_data.get_hourly_demand().shape, (24, len(self.network.loads)))
+        np.testing.assert_array_equal(day_ahead_data.get_hourly_capacity()[7], day_ahead_data.get_hourly_view(7).max_power)
+        np.testing.assert_array_equal(day_ahead_data.get_hourly_demand()[7], day_ahead_data.get_hourly_view(7).demand)
+    
     def test_24hour_simulation_basic(self):
         """测试24小时仿真基本功能"""
         day_ahead_data = create_sample_day_ahead_data(self.network)
@@ -173,6 +285,134 @@ class TestTimeSeriesSimulation(unittest.TestCase):
             for node_id, price in results[hour].items():
                 self.assertGreaterEqual(price, 0, f"小时 {hour}, 节点 {node_id} 出现负价格: {price}")
 
+    
+    def test_batched_24hour_clearing(self):
+        """测试24小时合并为一个线性规划求解"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        
+        algorithm = TimeSeriesLMPAlgorithm(day_ahead_data)
+        results = algorithm._calculate_batched_lmp()
+        
+        # 测试网络各时段容量充足，合并求解应当成功
+        self.assertIsNotNone(results)
+        self.assertEqual(len(results), 24)
+        for hour in range(24):
+            self.assertEqual(set(results[hour].keys()), set(self.network.nodes.keys()))
+
+    
+    def test_structure_shared_across_hours(self):
+        """测试各时段共享线性规划约束结构"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        algorithm = TimeSeriesLMPAlgorithm(day_ahead_data)
+        algorithm._build_static_structure()
+        
+        hourly = LMPAlgorithm(day_ahead_data.get_hourly_network(12), day_ahead_data.get_hourly_bid_data(12),
+                              ptdf=algorithm._ptdf, structure=algorithm._structure)
+        _, A_eq, _, A_ub, _, _ = hourly._build_optimization_problem()
+        self.assertIs(A_eq, algorithm._structure.A_eq)
+        self.assertIs(A_ub, algorithm._structure.A_ub)
+        
+        # 共享元件属性数组时不再遍历网络元件，结果与单独构建时一致
+        shared = LMPAlgorithm(self.network, ptdf=algorithm._ptdf, elements=algorithm._elements)
+        self.assertIs(shared._gen_node_idx, algorithm._elements.gen_node_idx)
+        self.assertEqual(shared.calculate_lmp(), LMPAlgorithm(self.network).calculate_lmp())
+    
+    def test_ptdf_reused_across_runs(self):
+        """测试传入已有PTDF矩阵时不再重新构建，结果与重新构建时一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        first = TimeSeriesLMPAlgorithm(day_ahead_data)
+        expected = first.calculate_24h_lmp()
+        
+        second = TimeSeriesLMPAlgorithm(day_ahead_data, ptdf=first.ptdf)
+        self.assertEqual(second.calculate_24h_lmp(), expected)
+        self.assertIs(second.ptdf, first.ptdf)
+    
+    def test_algorithm_reused_across_hours(self):
+        """测试逐小时替换容量和报价复用同一算法实例，结果与每小时新建实例一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        gen_max = day_ahead_data.get_hourly_capacity()
+        node_demand = day_ahead_data.get_hourly_node_demand()
+        reused = LMPAlgorithm(self.network)
+        for hour in (3, 12, 19):
+            bid_arrays = day_ahead_data.get_hourly_bid_arrays(hour)
+            reused.set_supply(gen_max[hour], bid_arrays)
+            fresh = LMPAlgorithm(self.network, gen_max=gen_max[hour], bid_arrays=bid_arrays)
+            self.assertEqual(reused.calculate_lmp(node_demand[hour]), fresh.calculate_lmp(node_demand[hour]))
+    
+    def test_parallel_hourly_clearing(self):
+        """测试逐小时并行求解与各小时单独求解的结果一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        gen_max = day_ahead_data.get_hourly_capacity()
+        node_demand = day_ahead_data.get_hourly_node_demand()
+        
+        parallel_results = run_time_series_clearing(day_ahead_data, max_workers=2)
+        self.assertEqual(set(parallel_results.keys()), set(range(24)))
+        for hour in range(24):
+            hourly = LMPAlgorithm(self.network, gen_max=gen_max[hour],
+                                  bid_arrays=day_ahead_data.get_hourly_bid_arrays(hour))
+            for node_id, price in hourly.calculate_lmp(node_demand[hour]).items():
+                self.assertAlmostEqual(parallel_results[hour][node_id], price, places=6)
+    
+    def test_pool_after_serial_clearing_exits(self):
+        """测试同一进程先串行出清再使用进程池后能正常退出（子进程中运行并设置超时）"""
+        script = textwrap.dedent("""
+            import contextlib, io
+            from power_market_simulator.models.time_series import create_sample_day_ahead_data
+            from power_market_simulator.algorithms.time_series_lmp import run_time_series_clearing
+            from power_market_simulator.time_series_simulation import create_sample_network
+            
+            if __name__ == "__main__":
+                with contextlib.redirect_stdout(io.StringIO()):
+                    data = create_sample_day_ahead_data(create_sample_network())
+                    serial = run_time_series_clearing(data)
+                    parallel = run_time_series_clearing(data, max_workers=2)
+                assert set(parallel) == set(serial) == set(range(24))
+        """)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            completed = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True,
+                                       timeout=300)
+        except subprocess.TimeoutExpired:
+            self.fail("串行出清后使用进程池，解释器未能在超时前退出")
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+    
+    @unittest.skipIf(highspy is None, "未安装highspy")
+    def test_warm_start_solver(self):
+        """测试热启动求解器与linprog结果一致"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        solver = HighsWarmStartSolver()
+        
+        for hour in (0, 1, 12):
+            algorithm = LMPAlgorithm(day_ahead_data.get_hourly_network(hour),
+                                     day_ahead_data.get_hourly_bid_data(hour))
+            c, A_eq, b_eq, A_ub, b_ub, bounds = algorithm._build_optimization_problem()
+            
+            warm = solver.solve(c, A_eq, b_eq, A_ub, b_ub, bounds)
+            cold = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+            
+            self.assertTrue(warm.success)
+            self.assertAlmostEqual(c @ warm.x, cold.fun, places=6)
+    
+    @unittest.skipIf(highspy is None, "未安装highspy")
+    def test_warm_start_solver_shared_structure(self):
+        """测试共享约束结构时热启动求解器原地更新模型"""
+        day_ahead_data = create_sample_day_ahead_data(self.network)
+        time_series = TimeSeriesLMPAlgorithm(day_ahead_data)
+        time_series._build_static_structure()
+        solver = HighsWarmStartSolver()
+        
+        for hour in (0, 12, 18):
+            algorithm = LMPAlgorithm(day_ahead_data.get_hourly_network(hour), day_ahead_data.get_hourly_bid_data(hour),
+                                     ptdf=time_series._ptdf, structure=time_series._structure)
+            c, A_eq, b_eq, A_ub, b_ub, bounds = algorithm._build_optimization_problem()
+            
+            warm = solver.solve(c, A_eq, b_eq, A_ub, b_ub, bounds)
+            cold = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+            
+            self.assertTrue(warm.success)
+            self.assertAlmostEqual(c @ warm.x, cold.fun, places=6)
+            self.assertIs(solver._matrices[0], time_series._structure.A_eq)
+
 
 def run_tests():
     """运行所有测试"""
@@ -2,11 +2,11 @@
 24-hour time series simulation demonstration program
 24小时时序仿真演示程序
 """
+
+import io
 import sys
-import os
 
-# 添加项目路径
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+import numpy as np
 
 from power_market_simulator.models.network import Network, Node, Generator, Load, TransmissionLine, GeneratorType
 from power_market_simulator.models.time_series import create_sample_day_ahead_data
@@ -191,46 +191,53 @@ def analyze_24h_results(hourly_results):
     """Analyze 24-hour simulation results
     分析24小时仿真结果
     """
-    print("\n24-hour simulation results analysis:")
-    print("\n24小时仿真结果分析:")
-    print("=" * 60)
+    # Arrange prices as a (24, n_nodes) matrix in node order
+    # 按节点顺序整理为(24, 节点数)的价格矩阵，统计量按行或列一次归约
+    node_ids = list(hourly_results[0].keys())
+    price_mat = np.array([[hourly_results[h][node_id] for node_id in node_ids] for h in range(24)])
+    
+    # Write the report into a buffer and output it once at the end
+    # 报告先写入缓冲区，最后一次性输出
+    buf = io.StringIO()
+    print("\n24-hour simulation results analysis:", file=buf)
+    print("\n24小时仿真结果分析:", file=buf)
+    print("=" * 60, file=buf)
     
     # Display results by hour
     # 按小时展示结果
     for hour in range(24):
-        print(f"\n第{hour:02d}时结果:")
-        for node_id, price in hourly_results[hour].items():
-            print(f"  {node_id}: {price:.2f} 元/MWh")
+        print(f"\n第{hour:02d}时结果:", file=buf)
+        for node_id, price in zip(node_ids, price_mat[hour].tolist()):
+            print(f"  {node_id}: {price:.2f} 元/MWh", file=buf)
     
     # Calculate daily average price for each node
     # 计算各节点的日平均价格
-    print(f"\nDaily average price for each node:")
-    print(f"\n各节点日平均价格:")
-    node_hours = list(hourly_results[0].keys())
-    for node_id in node_hours:
-        avg_price = sum(hourly_results[h][node_id] for h in range(24)) / 24
-        min_price = min(hourly_results[h][node_id] for h in range(24))
-        max_price = max(hourly_results[h][node_id] for h in range(24))
-        print(f"  {node_id}: Average {avg_price:.2f}, Min {min_price:.2f}, Max {max_price:.2f}")
-        print(f"  {node_id}: 平均{avg_price:.2f}, 最低{min_price:.2f}, 最高{max_price:.2f}")
+    print(f"\nDaily average price for each node:", file=buf)
+    print(f"\n各节点日平均价格:", file=buf)
+    node_stats = zip(node_ids, price_mat.mean(axis=0).tolist(), price_mat.min(axis=0).tolist(),
+                     price_mat.max(axis=0).tolist())
+    for node_id, avg_price, min_price, max_price in node_stats:
+        print(f"  {node_id}: Average {avg_price:.2f}, Min {min_price:.2f}, Max {max_price:.2f}", file=buf)
+        print(f"  {node_id}: 平均{avg_price:.2f}, 最低{min_price:.2f}, 最高{max_price:.2f}", file=buf)
     
     # Identify peak and off-peak periods
     # 识别高峰和低谷时段
-    print(f"\nSystem-wide analysis:")
-    print(f"\n系统整体分析:")
-    system_avg_prices = []
-    for hour in range(24):
-        avg_price = sum(hourly_results[hour].values()) / len(hourly_results[hour])
-        system_avg_prices.append(avg_price)
-        print(f"  {hour:02d}h system average price: {avg_price:.2f} CNY/MWh")
-        print(f"  {hour:02d}时系统平均价格: {avg_price:.2f} 元/MWh")
-    
-    peak_hour = system_avg_prices.index(max(system_avg_prices))
-    off_peak_hour = system_avg_prices.index(min(system_avg_prices))
-    print(f"\n  Peak price period: {peak_hour:02d}h ({max(system_avg_prices):.2f}CNY/MWh)")
-    print(f"  日内最高电价时段: {peak_hour:02d}时 ({max(system_avg_prices):.2f}元/MWh)")
-    print(f"  Off-peak price period: {off_peak_hour:02d}h ({min(system_avg_prices):.2f}CNY/MWh)")
-    print(f"  日内最低电价时段: {off_peak_hour:02d}时 ({min(system_avg_prices):.2f}元/MWh)")
+    print(f"\nSystem-wide analysis:", file=buf)
+    print(f"\n系统整体分析:", file=buf)
+    system_avg_prices = price_mat.mean(axis=1)
+    for hour, avg_price in enumerate(system_avg_prices.tolist()):
+        print(f"  {hour:02d}h system average price: {avg_price:.2f} CNY/MWh", file=buf)
+        print(f"  {hour:02d}时系统平均价格: {avg_price:.2f} 元/MWh", file=buf)
+    
+    peak_hour = int(system_avg_prices.argmax())
+    off_peak_hour = int(system_avg_prices.argmin())
+    peak_price, off_peak_price = system_avg_prices[peak_hour], system_avg_prices[off_peak_hour]
+    print(f"\n  Peak price period: {peak_hour:02d}h ({peak_price:.2f}CNY/MWh)", file=buf)
+    print(f"  日内最高电价时段: {peak_hour:02d}时 ({peak_price:.2f}元/MWh)", file=buf)
+    print(f"  Off-peak price period: {off_peak_hour:02d}h ({off_peak_price:.2f}CNY/MWh)", file=buf)
+    print(f"  日内最低电价时段: {off_peak_hour:02d}时 ({off_peak_price:.2f}元/MWh)", file=buf)
+    
+    sys.stdout.write(buf.getvalue())
 
 
 def main():